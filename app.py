@@ -1,19 +1,23 @@
 import streamlit as st
 import os
-import threading
 import time
-import pyttsx3
-from pathlib import Path
 from main import (
-    CATEGORIES, STORY_URLS, PDF_FOLDER,
-    load_stories_from_pdfs, scrape_stories,
-    store_in_chromadb, retrieve_relevant_docs,
-    generate_with_rag_enhanced, load_story_urls,
-    add_story_url, load_categories, add_category
+    PDF_FOLDER,
+    retrieve_relevant_docs,
+    stream_with_rag_enhanced, load_story_urls,
+    add_story_url, load_categories, add_category,
+    response_cache_stats, retrieval_cache_stats,
+    get_chroma_client, get_story_collection, get_openai_client,
+    synthesize_story_audio, TTS_AUDIO_FORMAT,
+    submit_ingest_job, get_ingest_job, invalidate_ingest_results, save_uploaded_pdf,
+    get_story_catalog, BROWSE_PAGE_SIZE
 )
 
 # Helper to safely force a rerun across Streamlit versions
 def safe_rerun():
+    # st.rerun() replaced experimental_rerun (removed in newer releases); it raises to stop the script
+    if hasattr(st, "rerun"):
+        st.rerun()
     try:
         # preferred if available
         st.experimental_rerun()
@@ -125,65 +129,217 @@ if 'audio_paused' not in st.session_state:
     st.session_state.audio_paused = False
 if 'audio_file_path' not in st.session_state:
     st.session_state.audio_file_path = None
+if 'audio_job' not in st.session_state:
+    st.session_state.audio_job = None
+if 'audio_metrics' not in st.session_state:
+    st.session_state.audio_metrics = {}
+
+# Background ingestion state
+if 'ingest_job_id' not in st.session_state:
+    st.session_state.ingest_job_id = None
+if 'ingest_message' not in st.session_state:
+    st.session_state.ingest_message = None
+# Browse tab: current page and the story whose full text is shown
+if 'browse_page' not in st.session_state:
+    st.session_state.browse_page = 0
+if 'browse_open' not in st.session_state:
+    st.session_state.browse_open = None
+
+# Data read from the category/URL files. Memoized across reruns; invalidate_story_data()
+# clears it (and marks finished story loads as outdated) after every admin change.
+@st.cache_data(show_spinner=False)
+def cached_categories():
+    return load_categories()
+
+@st.cache_data(show_spinner=False)
+def cached_story_urls():
+    return load_story_urls()
+
+def invalidate_story_data():
+    """Forget cached categories, URLs and loaded stories (after adding URLs, categories or PDFs)."""
+    cached_categories.clear()
+    cached_story_urls.clear()
+    invalidate_ingest_results()
+
+def categories_label(category):
+    return cached_categories().get(category, category)
+
+# Human-readable progress line and completion fraction for an ingest job snapshot
+def describe_ingest_progress(info):
+    counts = info["counts"]
+    stage = info["stage"]
+    if stage in ("fetching", "parsing") and counts.get("files_total"):
+        unit = "pages" if stage == "fetching" else "PDFs"
+        done = counts.get("files_parsed", 0)
+        return f"{stage.capitalize()} {unit}: {done}/{counts['files_total']}", done / counts["files_total"]
+    if stage == "splitting":
+        return f"Splitting {counts.get('stories', 0)} stories into chunks...", 0.0
+    if stage == "embedding" and counts.get("chunks"):
+        return (
+            f"Embedded {counts.get('embedded', 0)} · upserted {counts.get('upserted', 0)} "
+            f"of {counts['chunks']} chunks (new or changed only)",
+            min(1.0, counts.get("upserted", 0) / counts["chunks"])
+        )
+    return f"{stage.capitalize()}...", 0.0
+
+# Progress of this session's ingest job; while it runs this re-renders itself every second
+def ingest_job_panel():
+    job = get_ingest_job(st.session_state.ingest_job_id) if st.session_state.ingest_job_id else None
+    if job is None:
+        st.session_state.ingest_job_id = None
+        return
+    info = job.snapshot()
+    if not job.done():
+        text, fraction = describe_ingest_progress(info)
+        st.progress(fraction, text=f"{categories_label(job.category)}: {text}")
+        if st.button("✖ Cancel", key=f"cancel_ingest_{job.id}", disabled=job.cancelled()):
+            job.cancel()
+        if not hasattr(st, "fragment"):
+            st.button("Check progress", key="ingest_status_btn")
+        return
+
+    st.session_state.ingest_job_id = None
+    if info["status"] == "done" and job.result["stories"]:
+        stories, stats = job.result["stories"], job.result["stats"]
+        if job.category == st.session_state.current_category:
+            if job.paths and st.session_state.stories_loaded:
+                # Only the new files were read; add their stories to the ones already shown
+                st.session_state.scraped_stories = list(st.session_state.scraped_stories) + stories
+            else:
+                st.session_state.scraped_stories = stories
+            st.session_state.stories_loaded = True
+            get_story_collection(job.category)
+        prefix = "Extracted" if job.kind == "upload" else "Loaded"
+        st.session_state.ingest_message = ("success", (
+            f"{prefix} {len(stories)} stories in {info['elapsed']:.1f}s! "
+            f"({stats['added']} new stories, {stats['unchanged']} unchanged, {stats['removed']} removed)"
+        ))
+    elif info["status"] == "done":
+        st.session_state.ingest_message = ("error", "No stories found in this category.")
+    elif info["status"] == "cancelled":
+        st.session_state.ingest_message = ("warning", "Loading cancelled; stories stored so far stay searchable.")
+    else:
+        st.session_state.ingest_message = ("error", f"Loading failed: {info['error']}")
+    # Rerun the whole page so every tab sees the loaded stories
+    safe_rerun()
+
+if hasattr(st, "fragment"):
+    ingest_job_panel = st.fragment(run_every=1)(ingest_job_panel)
+
+def reset_browse():
+    st.session_state.browse_page = 0
+    st.session_state.browse_open = None
+
+def turn_browse_page(step):
+    st.session_state.browse_page = max(0, st.session_state.browse_page + step)
+    st.session_state.browse_open = None
+
+def toggle_browse_story(story_id):
+    st.session_state.browse_open = None if st.session_state.browse_open == story_id else story_id
+
+# Browse tab: one page of titles from the story catalog, filtered in SQL; the full text is read
+# only for the story the user opens, so the tab costs the same however many stories are stored.
+def browse_stories_panel():
+    catalog = get_story_catalog()
+    if catalog is None:
+        st.warning("Story browsing is unavailable.")
+        return
+    category = st.session_state.current_category
+    query = st.text_input("Filter by title or source", key="browse_query", on_change=reset_browse,
+                          placeholder="e.g. tenali, panchatantra.pdf")
+    total, items = catalog.page(category, query, st.session_state.browse_page, BROWSE_PAGE_SIZE)
+    pages = max(1, -(-total // BROWSE_PAGE_SIZE))
+    if st.session_state.browse_page >= pages:
+        # The category shrank or changed since the page was picked
+        st.session_state.browse_page = pages - 1
+        total, items = catalog.page(category, query, st.session_state.browse_page, BROWSE_PAGE_SIZE)
+
+    if not total:
+        st.info("No stories match this filter." if query else "No stories stored for this category yet.")
+        return
+    st.info(f"{'Matching' if query else 'Total'} stories: {total}")
+
+    for item in items:
+        opened = st.session_state.browse_open == item["id"]
+        st.button(f"{'📖' if opened else '📕'} {item['title'] or 'Untitled'} - {item['source']}",
+                  key=f"browse_{item['id']}", on_click=toggle_browse_story, args=(item["id"],),
+                  use_container_width=True)
+        if opened:
+            st.write(catalog.text(item["id"]))
+            st.caption(f"Source: {item['source']}")
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("◀ Previous", key="browse_prev", on_click=turn_browse_page, args=(-1,),
+                  disabled=st.session_state.browse_page == 0)
+    with page_col:
+        st.caption(f"Page {st.session_state.browse_page + 1} of {pages}")
+    with next_col:
+        st.button("Next ▶", key="browse_next", on_click=turn_browse_page, args=(1,),
+                  disabled=st.session_state.browse_page >= pages - 1)
+
+if hasattr(st, "fragment"):
+    browse_stories_panel = st.fragment(browse_stories_panel)
+
+# Create the shared clients up front so the first generation does not pay for them
+# (main.py keeps one of each per process, shared by every session and rerun)
+get_chroma_client()
+get_openai_client()
 
 # Function to generate audio file from text
-def generate_audio_file(text):
-    """Convert text to speech and save to MP3 file"""
+# Starts chunked synthesis on the TTS workers and returns at once; audio_job_panel() plays the
+# first chunk as soon as it is ready and swaps in the full story when it is stitched.
+# Audio is cached by (text, voice, rate); use_cache=False re-synthesizes ("Regenerate Audio").
+def generate_audio_file(text, use_cache=True):
+    """Queue text for speech synthesis; returns a StoryAudioJob"""
+    st.session_state.audio_job = synthesize_story_audio(text, use_cache=use_cache)
+    return st.session_state.audio_job
+
+# Status of the pending audio job; while it runs this re-renders itself every second
+def audio_job_panel():
+    job = st.session_state.audio_job
+    if job is None:
+        return
+    if not job.done():
+        first = job.first_chunk
+        first_audio = None
+        if first.done() and first.exception() is None:
+            try:
+                with open(first.result(), 'rb') as audio_file:
+                    first_audio = audio_file.read()
+            except OSError:
+                pass  # evicted from the audio cache meanwhile; the full story follows
+        if first_audio is not None:
+            st.info("▶️ The beginning of the story is ready; the rest is still being synthesized...")
+            st.audio(first_audio, format=TTS_AUDIO_FORMAT)
+        else:
+            st.info("⏳ Generating audio in the background...")
+        if not hasattr(st, "fragment"):
+            st.button("Check audio status", key="audio_status_btn")
+        return
+    st.session_state.audio_job = None
     try:
-        engine = pyttsx3.init()
-        
-        # Select Indian accent voice
-        try:
-            voices = engine.getProperty('voices') or []
-            selected_voice = None
-            
-            indian_keys = ("indian", "india", "aditi", "neena", "hindi", "en_in", "en-in", "en_in.utf8")
-            for v in voices:
-                name_id = " ".join(filter(None, [getattr(v, "name", ""), getattr(v, "id", "")])).lower()
-                if any(k in name_id for k in indian_keys):
-                    selected_voice = v
-                    break
-            
-            if not selected_voice:
-                for v in voices:
-                    langs = getattr(v, "languages", None)
-                    if langs and any("in" in str(l).lower() for l in langs):
-                        selected_voice = v
-                        break
-            
-            if not selected_voice:
-                for v in voices:
-                    name_id = " ".join(filter(None, [getattr(v, "name", ""), getattr(v, "id", "")])).lower()
-                    if any(k in name_id for k in ("female", "zira", "samantha", "karen")):
-                        selected_voice = v
-                        break
-            
-            if not selected_voice and len(voices) > 1:
-                selected_voice = voices[1]
-            
-            if selected_voice:
-                engine.setProperty('voice', selected_voice.id)
-            
-            rate = engine.getProperty('rate')
-            engine.setProperty('rate', int(rate * 0.98))
-        
-        except Exception:
-            pass
-        
-        # Create temp directory for audio files
-        temp_dir = Path("./temp_audio")
-        temp_dir.mkdir(exist_ok=True)
-        
-        # Save audio file
-        audio_file = temp_dir / "story_audio.mp3"
-        engine.save_to_file(text, str(audio_file))
-        engine.runAndWait()
-        
-        return str(audio_file)
-    
+        st.session_state.audio_file_path = job.result.result()
+        st.session_state.audio_metrics = dict(job.metrics)
     except Exception as e:
         st.error(f"Error generating audio: {str(e)}")
-        return None
+        return
+    # Rerun the whole page so the player below shows the new file
+    safe_rerun()
+
+if hasattr(st, "fragment"):
+    audio_job_panel = st.fragment(run_every=1)(audio_job_panel)
+
+# Render a generated story into a placeholder while it streams; returns (text, metrics)
+def stream_story(placeholder, prefs, docs, category, use_cache=True):
+    metrics = {}
+    text = ""
+    for piece in stream_with_rag_enhanced(prefs, docs, category, use_cache=use_cache, metrics=metrics):
+        text += piece
+        placeholder.markdown(text + "▌")
+    text = text.strip()
+    placeholder.markdown(text)
+    return text, metrics
 
 # Header: centered large logo above the page title
 logo_path = os.path.join(os.path.dirname(__file__), "image", "logo.png")
@@ -205,12 +361,13 @@ with st.sidebar:
     
     # Category selection
     st.subheader("Story Category")
-    category_options = list(CATEGORIES.items())
+    categories = cached_categories()
+    category_options = list(categories.items())
     selected_idx = next((i for i, (k, v) in enumerate(category_options) if k == st.session_state.current_category), 0)
     selected_category = st.selectbox(
         "Select story category:",
         options=[cat[0] for cat in category_options],
-        format_func=lambda x: CATEGORIES[x],
+        format_func=lambda x: categories[x],
         index=selected_idx,
         key="category_select"
     )
@@ -219,27 +376,33 @@ with st.sidebar:
     if selected_category != st.session_state.current_category:
         st.session_state.current_category = selected_category
         st.session_state.stories_loaded = False
+        reset_browse()
     
-    if st.button("Load Stories", key="load_btn"):
-        with st.spinner("Loading stories..."):
-            if st.session_state.current_category == "web":
-                st.session_state.scraped_stories = scrape_stories()
-            else:
-                st.session_state.scraped_stories = load_stories_from_pdfs(st.session_state.current_category)
-            
-            if st.session_state.scraped_stories:
-                store_in_chromadb(st.session_state.scraped_stories, st.session_state.current_category)
-                st.session_state.stories_loaded = True
-                st.success(f"Loaded {len(st.session_state.scraped_stories)} stories!")
-            else:
-                st.error("No stories found in this category.")
+    # Loading runs as a background job; the panel below polls it
+    if st.button("Load Stories", key="load_btn", disabled=st.session_state.ingest_job_id is not None):
+        job = submit_ingest_job(st.session_state.current_category)
+        st.session_state.ingest_job_id = job.id
+        st.session_state.ingest_message = None
     
+    if st.session_state.ingest_job_id:
+        ingest_job_panel()
+    if st.session_state.ingest_message:
+        level, message = st.session_state.ingest_message
+        getattr(st, level)(message)
+    
+    cache_stats = response_cache_stats()
+    st.caption(f"Story cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['size']} cached)")
+    retrieval_stats = retrieval_cache_stats()
+    st.caption(f"Retrieval cache: {retrieval_stats['hit_rate']:.0%} hit rate ({retrieval_stats['hits']} hits / {retrieval_stats['misses']} misses)")
+    if retrieval_stats["lexical_fallbacks"]:
+        st.caption(f"Keyword search timed out {retrieval_stats['lexical_fallbacks']} time(s); those queries used vector ranking only")
+
     st.divider()
     
     # Story sources
     st.subheader("📚 Story Sources")
     if st.session_state.current_category == "web":
-        for i, url in enumerate(STORY_URLS, 1):
+        for i, url in enumerate(cached_story_urls(), 1):
             st.caption(f"{i}. {url}")
     else:
         if st.session_state.scraped_stories:
@@ -251,8 +414,6 @@ with st.sidebar:
     st.divider()
     st.subheader("🔐 Admin")
     with st.expander("Manage Categories & Upload PDFs", expanded=False):
-        # Reload categories each render to get latest file state
-        categories = load_categories()
         cat_keys = list(categories.keys())
         chosen_cat = st.selectbox("Select category for upload:", options=cat_keys, format_func=lambda k: categories[k])
 
@@ -268,6 +429,7 @@ with st.sidebar:
                 new_dir = os.path.join(PDF_FOLDER, new_cat_key.strip())
                 os.makedirs(new_dir, exist_ok=True)
                 if ok:
+                    invalidate_story_data()
                     st.success(f"Category '{new_cat_key}' added. Reloading UI...")
                     safe_rerun()
                 else:
@@ -278,26 +440,25 @@ with st.sidebar:
         uploaded = st.file_uploader("Choose PDF files", type=["pdf"], accept_multiple_files=True)
         if uploaded:
             if st.button("Upload PDFs"):
-                saved = 0
+                saved_paths = []
                 for up in uploaded:
                     try:
-                        dest_dir = os.path.join(PDF_FOLDER, chosen_cat)
-                        os.makedirs(dest_dir, exist_ok=True)
-                        dest_path = os.path.join(dest_dir, up.name)
-                        with open(dest_path, "wb") as f:
-                            f.write(up.getbuffer())
-                        saved += 1
+                        # Streamed to disk in chunks and hashed; identical files are skipped
+                        up.seek(0)
+                        dest_path, duplicate = save_uploaded_pdf(chosen_cat, up.name, up)
+                        if dest_path:
+                            saved_paths.append(dest_path)
+                        else:
+                            st.info(f"Skipped {up.name}: same content as {duplicate}")
                     except Exception as e:
                         st.error(f"Failed to save {up.name}: {str(e)}")
-                if saved:
-                    st.success(f"Saved {saved} file(s) to category '{categories[chosen_cat]}'")
-                    # Extract stories from newly uploaded PDFs and store
-                    new_stories = load_stories_from_pdfs(chosen_cat)
-                    if new_stories:
-                        store_in_chromadb(new_stories, chosen_cat)
-                        st.success(f"Extracted and stored {len(new_stories)} story(ies) from uploaded PDFs.")
-                    else:
-                        st.info("No stories extracted from uploaded PDFs.")
+                if saved_paths:
+                    invalidate_story_data()
+                    st.success(f"Saved {len(saved_paths)} file(s) to category '{categories[chosen_cat]}'")
+                    # Extract only the new PDFs in the background; the rest of the category is untouched
+                    job = submit_ingest_job(chosen_cat, kind="upload", paths=saved_paths, reuse=False)
+                    st.session_state.ingest_job_id = job.id
+                    st.session_state.ingest_message = None
                     safe_rerun()
 
     with st.expander("Manage Story URLs", expanded=False):
@@ -309,13 +470,14 @@ with st.sidebar:
             else:
                 ok = add_story_url(new_url.strip())
                 if ok:
+                    invalidate_story_data()
                     st.success("URL added. Reloading URLs...")
                     safe_rerun()
                 else:
                     st.warning("URL already present or failed to add.")
 
         st.markdown("**Current story URLs**")
-        urls = load_story_urls()
+        urls = cached_story_urls()
         for i, u in enumerate(urls, 1):
             st.caption(f"{i}. {u}")
 
@@ -346,48 +508,49 @@ else:
             )
         
         col1, col2 = st.columns(2)
+        generate_mode = None
         
         with col1:
             if st.button("✨ Generate Story", key="generate_btn", use_container_width=True):
                 if not topic:
                     st.error("Please enter a story topic!")
                 else:
-                    with st.spinner("Retrieving relevant stories..."):
-                        docs = retrieve_relevant_docs(topic, st.session_state.current_category, top_k=3)
-                    
-                    with st.spinner("Generating story..."):
-                        prefs = {
-                            "topic": topic,
-                            "length": length,
-                            "tone": tone
-                        }
-                        st.session_state.current_story = generate_with_rag_enhanced(
-                            prefs, docs, st.session_state.current_category
-                        )
-                    
-                    st.success("Story generated successfully!")
+                    generate_mode = "generate"
         
         with col2:
             if st.button("🔄 Regenerate", key="regenerate_btn", use_container_width=True, disabled=st.session_state.current_story is None):
                 if st.session_state.current_story is None:
                     st.error("Generate a story first!")
                 else:
-                    with st.spinner("Retrieving relevant stories..."):
-                        docs = retrieve_relevant_docs(topic, st.session_state.current_category, top_k=3)
-                    
-                    with st.spinner("Regenerating story..."):
-                        prefs = {
-                            "topic": topic,
-                            "length": length,
-                            "tone": tone
-                        }
-                        st.session_state.current_story = generate_with_rag_enhanced(
-                            prefs, docs, st.session_state.current_category
-                        )
-                    
-                    st.success("Story regenerated!")
+                    generate_mode = "regenerate"
         
-        if st.session_state.current_story:
+        if generate_mode:
+            with st.spinner("Retrieving relevant stories..."):
+                docs = retrieve_relevant_docs(topic, st.session_state.current_category, top_k=3)
+            
+            prefs = {
+                "topic": topic,
+                "length": length,
+                "tone": tone
+            }
+            st.divider()
+            st.markdown(f"<div class='story-title'>Generated Story</div>", unsafe_allow_html=True)
+            # Regenerate asks for a fresh sample instead of the cached one
+            story, metrics = stream_story(
+                st.empty(), prefs, docs, st.session_state.current_category,
+                use_cache=(generate_mode == "generate")
+            )
+            st.session_state.current_story = story
+            if generate_mode == "generate":
+                st.success("Story generated successfully!")
+            else:
+                st.success("Story regenerated!")
+            if "ttft" in metrics:
+                caption = f"First words after {metrics['ttft']:.2f}s · done in {metrics.get('total', 0):.2f}s"
+                if "prompt_tokens" in metrics:
+                    caption += f" · {metrics['prompt_tokens']} prompt tokens"
+                st.caption(caption)
+        elif st.session_state.current_story:
             st.divider()
             st.markdown("<div class='story-container'>", unsafe_allow_html=True)
             st.markdown(f"<div class='story-title'>Generated Story</div>", unsafe_allow_html=True)
@@ -397,15 +560,8 @@ else:
     with tab2:
         st.subheader("📚 Browse Available Stories")
         
-        if st.session_state.scraped_stories:
-            story_count = len(st.session_state.scraped_stories)
-            st.info(f"Total stories available: {story_count}")
-            
-            # Create columns for story display
-            for i, story_obj in enumerate(st.session_state.scraped_stories):
-                with st.expander(f"📖 {story_obj.get('title', 'Untitled')} - {story_obj['source']}", expanded=False):
-                    st.write(story_obj["content"])
-                    st.caption(f"Source: {story_obj['source']}")
+        if st.session_state.stories_loaded:
+            browse_stories_panel()
         else:
             st.warning("No stories loaded. Please load stories from the sidebar.")
     
@@ -419,28 +575,21 @@ else:
             
             with col1:
                 if st.button("🎵 Generate Audio", key="generate_audio_btn", use_container_width=True):
-                    with st.spinner("Generating audio file..."):
-                        audio_file = generate_audio_file(st.session_state.current_story)
-                        if audio_file and os.path.exists(audio_file):
-                            st.session_state.audio_file_path = audio_file
-                            st.success("✅ Audio generated successfully!")
-                        else:
-                            st.error("Failed to generate audio file")
+                    generate_audio_file(st.session_state.current_story)
             
             with col2:
                 if st.button("🗑️ Clear Audio", key="clear_audio_btn", use_container_width=True):
                     st.session_state.audio_file_path = None
+                    st.session_state.audio_job = None
+                    st.session_state.audio_metrics = {}
                     st.info("Audio cleared")
             
             with col3:
                 if st.button("🔄 Regenerate Audio", key="regen_audio_btn", use_container_width=True):
-                    with st.spinner("Regenerating audio file..."):
-                        audio_file = generate_audio_file(st.session_state.current_story)
-                        if audio_file and os.path.exists(audio_file):
-                            st.session_state.audio_file_path = audio_file
-                            st.success("✅ Audio regenerated!")
-                        else:
-                            st.error("Failed to regenerate audio")
+                    generate_audio_file(st.session_state.current_story, use_cache=False)
+            
+            if st.session_state.audio_job is not None:
+                audio_job_panel()
             
             st.divider()
             
@@ -448,7 +597,13 @@ else:
             if st.session_state.audio_file_path and os.path.exists(st.session_state.audio_file_path):
                 st.subheader("🎧 Audio Player")
                 with open(st.session_state.audio_file_path, 'rb') as audio_file:
-                    st.audio(audio_file, format="audio/mp3")
+                    st.audio(audio_file, format=TTS_AUDIO_FORMAT)
+                audio_metrics = st.session_state.audio_metrics
+                if "ttfa" in audio_metrics:
+                    st.caption(
+                        f"First audio after {audio_metrics['ttfa']:.2f}s · full story in {audio_metrics['total']:.2f}s"
+                        f" ({audio_metrics.get('chunks') or 1} chunk(s))"
+                    )
                 st.info("Use the player controls above to play, pause, or stop the audio")
             else:
                 st.info("👆 Click 'Generate Audio' button above to create audio from the story")
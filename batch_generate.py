@@ -0,0 +1,229 @@
+"""
+Batch story generation from a JSONL file of preference records.
+
+Each input line is a JSON object such as
+    {"id": "kindness-1", "topic": "kindness", "tone": "moral lesson", "length": "~300 words", "category": "moral"}
+Only "topic" is required; "id" (or "request_id") defaults to a hash of the record.
+
+Stories are retrieved from the persistent ChromaDB store (load the categories first via
+main.py or the Streamlit app) and generated with generate_with_rag_enhanced using a
+bounded thread pool. Each result is appended to the output JSONL as soon as it is ready,
+so an interrupted run picks up where it stopped when started again with the same output.
+
+Usage: python batch_generate.py prefs.jsonl stories_out.jsonl [--concurrency 4] [--top-k 3]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from main import (
+    CATEGORIES, retrieve_relevant_docs, retrieve_relevant_docs_batch,
+    generate_with_rag_enhanced
+)
+
+DEFAULT_TONE = "moral lesson"
+DEFAULT_LENGTH = "~300 words"
+DEFAULT_CATEGORY = "web"
+
+# Queries sent to Chroma per batched retrieval call
+RETRIEVAL_BATCH_SIZE = 64
+
+
+def record_id(record):
+    """Stable id for a preference record (explicit id, or a hash of its content)."""
+    explicit = record.get("id") or record.get("request_id")
+    if explicit:
+        return str(explicit)
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def read_requests(path):
+    """Yield (line_no, record) for every valid JSON object in the input file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            s = line.strip()
+            if not s:
+                continue
+            try:
+                record = json.loads(s)
+            except ValueError as e:
+                print(f"Skipping line {line_no}: invalid JSON ({e})")
+                continue
+            if not isinstance(record, dict) or not str(record.get("topic", "")).strip():
+                print(f"Skipping line {line_no}: missing topic")
+                continue
+            yield line_no, record
+
+
+def completed_ids(output_path):
+    """Ids already generated successfully in a previous (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # partial last line from an interrupted write
+            if row.get("status") == "ok":
+                done.add(row.get("id"))
+    return done
+
+
+def prefetch_docs(records, top_k=3):
+    """
+    Retrieve context for many records with batched queries; returns {record id: docs}.
+    Records whose batch fails are left out, so generate_one retrieves them one by one.
+    """
+    by_category = {}
+    for record in records:
+        by_category.setdefault(record.get("category") or DEFAULT_CATEGORY, []).append(record)
+
+    docs_by_id = {}
+    for category, group in by_category.items():
+        for start in range(0, len(group), RETRIEVAL_BATCH_SIZE):
+            chunk = group[start:start + RETRIEVAL_BATCH_SIZE]
+            try:
+                results = retrieve_relevant_docs_batch(
+                    [str(r["topic"]).strip() for r in chunk], category=category, top_k=top_k
+                )
+            except Exception as e:
+                print(f"Batched retrieval failed for {category}, falling back per story: {e}")
+                continue
+            for record, hits in zip(chunk, results):
+                docs_by_id[record_id(record)] = [h["document"] for h in hits]
+    return docs_by_id
+
+
+def generate_one(record, top_k=3, docs=None):
+    """Retrieve (unless docs are given) and generate one story; returns the output row (never raises)."""
+    category = record.get("category") or DEFAULT_CATEGORY
+    prefs = {
+        "topic": str(record["topic"]).strip(),
+        "tone": record.get("tone") or DEFAULT_TONE,
+        "length": record.get("length") or DEFAULT_LENGTH,
+    }
+    row = {"id": record_id(record), "category": category, **prefs}
+    start = time.perf_counter()
+    try:
+        if docs is None:
+            docs = retrieve_relevant_docs(prefs["topic"], category, top_k=top_k)
+        metrics = {}
+        story = generate_with_rag_enhanced(prefs, docs, category, metrics=metrics)
+        if metrics.get("fallback"):
+            # No key, no package or an API error: not a story, so a resumed run retries it
+            raise RuntimeError(metrics["fallback"])
+        row["story"] = story
+        row["status"] = "ok"
+        if "prompt_tokens" in metrics:
+            row["prompt_tokens"] = metrics["prompt_tokens"]
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = str(e)
+    row["latency"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_batch(input_path, output_path, concurrency=4, top_k=3):
+    """Generate every pending record; returns a summary dict with throughput and latencies."""
+    done = completed_ids(output_path)
+    pending = []
+    seen = set(done)
+    for _line_no, record in read_requests(input_path):
+        rid = record_id(record)
+        if rid in seen:
+            continue
+        seen.add(rid)
+        if record.get("category") and record["category"] not in CATEGORIES:
+            print(f"Warning: unknown category '{record['category']}' for {rid}")
+        pending.append(record)
+
+    print(f"{len(done)} already done, {len(pending)} to generate with concurrency {concurrency}")
+
+    start = time.perf_counter()
+    docs_by_id = prefetch_docs(pending, top_k)
+
+    latencies = []
+    counts = {"ok": 0, "error": 0}
+    prompt_tokens = 0
+    write_lock = threading.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Keep at most 2x concurrency requests in flight so huge inputs are not all queued up front
+        records = iter(pending)
+        in_flight = set()
+        while True:
+            while len(in_flight) < concurrency * 2:
+                record = next(records, None)
+                if record is None:
+                    break
+                in_flight.add(pool.submit(generate_one, record, top_k, docs_by_id.get(record_id(record))))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = future.result()
+                with write_lock:
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                counts[row["status"]] += 1
+                prompt_tokens += row.get("prompt_tokens", 0)
+                latencies.append(row["latency"])
+                total = counts["ok"] + counts["error"]
+                print(f"[{total}/{len(pending)}] {row['id']}: {row['status']} in {row['latency']:.2f}s")
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    summary = {
+        "generated": counts["ok"],
+        "errors": counts["error"],
+        "skipped": len(done),
+        "elapsed": round(elapsed, 2),
+        "throughput_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "p50": round(percentile(latencies, 50), 3),
+        "p90": round(percentile(latencies, 90), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "prompt_tokens": prompt_tokens,
+    }
+    return summary
+
+
+def main_cli(argv=None):
+    ap = argparse.ArgumentParser(description="Batch-generate stories from a JSONL file of preferences.")
+    ap.add_argument("input", help="JSONL file with one preference record per line")
+    ap.add_argument("output", help="JSONL file results are appended to (reused to resume)")
+    ap.add_argument("--concurrency", type=int, default=4, help="parallel generations (default 4)")
+    ap.add_argument("--top-k", type=int, default=3, help="documents retrieved per story (default 3)")
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Input file not found: {args.input}")
+        return 1
+
+    summary = run_batch(args.input, args.output, max(1, args.concurrency), args.top_k)
+    print("\n=== Batch summary ===")
+    print(f"Generated: {summary['generated']}  Errors: {summary['errors']}  Skipped (already done): {summary['skipped']}")
+    print(f"Elapsed: {summary['elapsed']}s  Throughput: {summary['throughput_per_min']} stories/min")
+    print(f"Latency p50: {summary['p50']}s  p90: {summary['p90']}s  p99: {summary['p99']}s")
+    print(f"Prompt tokens sent: {summary['prompt_tokens']}")
+    return 0 if summary["errors"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
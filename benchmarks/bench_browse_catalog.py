@@ -0,0 +1,76 @@
+"""
+Benchmark: Browse tab query latency of the story catalog as the corpus grows.
+
+Fills a throwaway StoryCatalog with --sizes synthetic stories per category and times
+StoryCatalog.page for the first and last page, with and without a title/source filter,
+plus StoryCatalog.text for opening one story. These are the only store reads a Browse tab
+rerun makes, so the tab's cost follows these numbers rather than the number of stories.
+
+Usage: python benchmarks/bench_browse_catalog.py [--sizes 1000,10000,100000] [--repeat 20]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+NAMES = ["Tenali Rama", "Birbal", "Akbar", "Krishna", "Hanuman", "Vikram", "Betaal"]
+
+
+def fill(catalog, category, n, seed=5):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        title = f"{rng.choice(NAMES)} and the {rng.choice(['crow', 'king', 'river', 'pot'])} {i}"
+        rows.append((f"{category}_{i}", title, f"book_{i % 40}.pdf", "Once upon a time. " * 100))
+    start = time.perf_counter()
+    catalog.sync(category, rows)
+    return time.perf_counter() - start
+
+
+def timed_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_browse_")
+    try:
+        catalog = main.StoryCatalog(os.path.join(work_dir, "story_catalog.sqlite3"))
+        page_size = main.BROWSE_PAGE_SIZE
+        header = (f"{'stories':>9}{'sync s':>8}{'first ms':>10}{'last ms':>9}"
+                  f"{'filter ms':>11}{'matches':>9}{'open ms':>9}")
+        print(header)
+        print("-" * len(header))
+        for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            category = f"bench{n}"
+            sync_s = fill(catalog, category, n)
+            last_page = (n - 1) // page_size
+            first = timed_ms(lambda: catalog.page(category, "", 0, page_size), args.repeat)
+            last = timed_ms(lambda: catalog.page(category, "", last_page, page_size), args.repeat)
+            filtered = timed_ms(lambda: catalog.page(category, "birbal crow", 0, page_size), args.repeat)
+            matches = catalog.page(category, "birbal crow", 0, page_size)[0]
+            opened = timed_ms(lambda: catalog.text(f"{category}_{n // 2}"), args.repeat)
+            print(f"{n:>9}{sync_s:>8.1f}{first:>10.2f}{last:>9.2f}{filtered:>11.2f}{matches:>9}{opened:>9.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_bench()
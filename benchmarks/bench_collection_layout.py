@@ -0,0 +1,154 @@
+"""
+Benchmark: per-category collections vs one unified collection with a category filter.
+
+Each layout is built in a fresh temporary ChromaDB store inside its own process, using
+random unit vectors (384-d, like the default MiniLM embedder) so the numbers reflect the
+index layout rather than embedding speed. Reports single-category and cross-category
+query latency, peak RSS of the process and on-disk size.
+
+Usage: python benchmarks/bench_collection_layout.py [--per-category 2000] [--categories 5] [--queries 200]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+DIM = 384
+
+
+def _rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return float("nan")
+
+
+def _dir_size_mb(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+def _vectors(rng, n):
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _percentile_ms(samples, pct):
+    return float(np.percentile(np.array(samples) * 1000, pct))
+
+
+def run_layout(layout, per_category, n_categories, n_queries, top_k, out):
+    import chromadb
+
+    rng = np.random.default_rng(42)
+    categories = [f"cat{i}" for i in range(n_categories)]
+    path = tempfile.mkdtemp(prefix=f"bench_{layout}_")
+    try:
+        client = chromadb.PersistentClient(path=path)
+        collections = {}
+        if layout == "unified":
+            shared = client.get_or_create_collection(name="stories_all")
+            collections = {c: shared for c in categories}
+        else:
+            collections = {c: client.get_or_create_collection(name=f"stories_{c}") for c in categories}
+
+        build_start = time.perf_counter()
+        for c in categories:
+            vecs = _vectors(rng, per_category)
+            for start in range(0, per_category, 1000):
+                end = min(start + 1000, per_category)
+                collections[c].add(
+                    ids=[f"{c}_{i}" for i in range(start, end)],
+                    embeddings=vecs[start:end].tolist(),
+                    documents=[f"story {i} of {c}" for i in range(start, end)],
+                    metadatas=[{"category": c, "source": f"{c}.pdf", "title": f"Story {i}"} for i in range(start, end)],
+                )
+        build_time = time.perf_counter() - build_start
+
+        queries = _vectors(rng, n_queries)
+
+        # Queries within one category
+        single = []
+        for qi, q in enumerate(queries):
+            c = categories[qi % n_categories]
+            where = {"category": c} if layout == "unified" else None
+            t = time.perf_counter()
+            collections[c].query(query_embeddings=[q.tolist()], n_results=top_k, where=where)
+            single.append(time.perf_counter() - t)
+
+        # "Any story about ..." across every category
+        cross = []
+        for q in queries:
+            t = time.perf_counter()
+            if layout == "unified":
+                shared.query(query_embeddings=[q.tolist()], n_results=top_k)
+            else:
+                hits = []
+                for c in categories:
+                    r = collections[c].query(query_embeddings=[q.tolist()], n_results=top_k)
+                    hits.extend(zip(r["distances"][0], r["ids"][0]))
+                sorted(hits)[:top_k]
+            cross.append(time.perf_counter() - t)
+
+        out.put({
+            "layout": layout,
+            "build_s": build_time,
+            "single_p50": _percentile_ms(single, 50),
+            "single_p95": _percentile_ms(single, 95),
+            "cross_p50": _percentile_ms(cross, 50),
+            "cross_p95": _percentile_ms(cross, 95),
+            "rss_mb": _rss_mb(),
+            "disk_mb": _dir_size_mb(path),
+        })
+    except Exception as e:
+        out.put({"layout": layout, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--per-category", type=int, default=2000)
+    ap.add_argument("--categories", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=3)
+    args = ap.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for layout in ("per_category", "unified"):
+        out = ctx.Queue()
+        proc = ctx.Process(target=run_layout, args=(layout, args.per_category, args.categories, args.queries, args.top_k, out))
+        proc.start()
+        results.append(out.get())
+        proc.join()
+
+    print(f"{args.categories} categories x {args.per_category} stories, {args.queries} queries, top_k={args.top_k}\n")
+    header = (f"{'layout':<14}{'build s':>9}{'1-cat p50 ms':>14}{'1-cat p95 ms':>14}"
+              f"{'all p50 ms':>12}{'all p95 ms':>12}{'RSS MB':>9}{'disk MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['layout']:<14}failed: {r['error']}")
+            continue
+        print(f"{r['layout']:<14}{r['build_s']:>9.1f}{r['single_p50']:>14.2f}{r['single_p95']:>14.2f}"
+              f"{r['cross_p50']:>12.2f}{r['cross_p95']:>12.2f}{r['rss_mb']:>9.0f}{r['disk_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,92 @@
+"""
+Benchmark: ingest throughput (stories/sec) of store_in_chromadb with the local embedding layer.
+
+Runs against a throwaway ChromaDB store and embedding cache. Measures:
+  - chroma:  Chroma's implicit embedding function (EMBEDDING_BACKEND=chroma, the old path)
+  - cold:    StoryEmbedder with an empty cache, for each --batch-sizes value
+  - warm:    the same stories re-ingested into a fresh collection (every vector is a cache hit)
+The synthetic corpus repeats --dup-ratio of its stories, as folders with reprinted
+anthologies do; duplicates are embedded once by StoryEmbedder.
+
+Usage: python benchmarks/bench_embedding_ingest.py [--stories 2000] [--batch-sizes 16,64,128] [--threads 4]
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="bench_embed_")
+os.environ["CHROMA_DB_PATH"] = os.path.join(WORK_DIR, "chroma")
+os.environ["AI_NANI_CACHE_DIR"] = os.path.join(WORK_DIR, "cache")
+sys.path.insert(0, ROOT)
+
+import main
+
+WORDS = ("king minister clever crow river forest kind greedy trader village elephant "
+         "monkey lesson wise honest golden pot farmer festival temple brave child").split()
+
+
+def synthetic_stories(n, dup_ratio, seed=7):
+    rng = random.Random(seed)
+    unique = max(1, int(n * (1 - dup_ratio)))
+    base = []
+    for i in range(unique):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(120, 220))).capitalize() + "."
+        base.append({"content": text, "source": f"book_{i % 40}.pdf", "title": f"Story {i}"})
+    stories = list(base)
+    while len(stories) < n:
+        stories.append(dict(rng.choice(base), source=f"reprint_{len(stories) % 7}.pdf"))
+    return stories
+
+
+def timed_ingest(stories, category):
+    start = time.perf_counter()
+    main.store_in_chromadb(stories, category)
+    return time.perf_counter() - start
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--stories", type=int, default=2000)
+    ap.add_argument("--dup-ratio", type=float, default=0.2)
+    ap.add_argument("--batch-sizes", default="16,64,128")
+    ap.add_argument("--threads", type=int, default=main.EMBEDDING_THREADS)
+    ap.add_argument("--skip-chroma", action="store_true", help="skip the implicit-embedding baseline")
+    args = ap.parse_args()
+
+    stories = synthetic_stories(args.stories, args.dup_ratio)
+    rows = []
+    try:
+        if not args.skip_chroma:
+            main.EMBEDDING_BACKEND = "chroma"
+            elapsed = timed_ingest(stories, "bench_chroma")
+            rows.append(("chroma (implicit)", "-", elapsed))
+
+        main.EMBEDDING_BACKEND = "onnx"
+        for batch_size in [int(b) for b in args.batch_sizes.split(",") if b.strip()]:
+            cache_path = os.path.join(WORK_DIR, "cache", f"embeddings_{batch_size}.sqlite3")
+            embedder = main.StoryEmbedder(batch_size=batch_size, threads=args.threads, cache_path=cache_path)
+            main.set_embedder(embedder)
+            elapsed = timed_ingest(stories, f"bench_cold_{batch_size}")
+            rows.append((f"cold  batch={batch_size}", embedder.misses, elapsed))
+
+            embedder.hits = embedder.misses = 0
+            elapsed = timed_ingest(stories, f"bench_warm_{batch_size}")
+            rows.append((f"warm  batch={batch_size}", embedder.misses, elapsed))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(f"\n{len(stories)} stories ({args.dup_ratio:.0%} duplicates), threads={args.threads or 'default'}\n")
+    header = f"{'run':<22}{'embedded':>10}{'seconds':>10}{'stories/s':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, embedded, elapsed in rows:
+        print(f"{name:<22}{embedded!s:>10}{elapsed:>10.2f}{len(stories) / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main_bench()
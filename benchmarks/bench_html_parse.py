@@ -0,0 +1,137 @@
+"""
+Micro-benchmark: legacy scrape_stories HTML extraction vs parse_stories_from_html.
+
+Fixtures are every page body saved by the HTTP cache (cache/http/*.body), small malformed
+pages (unclosed tags, headings outside <body>, "<body" inside comments and scripts) and
+synthetic story pages of increasing size written to cache/bench_fixtures/.
+Each fixture is checked for identical output before timings are reported; a backend that
+repairs markup differently (HTML_PARSER=lxml) shows up as MISMATCH on the malformed pages.
+
+Columns: "default" is parse_stories_from_html as shipped (the restricted html.parser parse),
+"soup" the same sibling walk over a full BeautifulSoup tree. With the single-pass walk
+alone (the "soup" column) small pages gain nothing (0.9-1.1x at 50 headings, run to run)
+and the win only shows at hundreds of headings, because building the tree is about 90% of
+the time. The restricted parse measured 2-2.6x on the small malformed pages, 3.2x at 50
+headings, 3.9x at 500 and 8x at 3000 (best of 5, html.parser, bs4 4.15).
+
+Usage: python benchmarks/bench_html_parse.py [--repeat N]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+import main
+
+
+def legacy_parse(content):
+    """The original scrape_stories loop (find_next_siblings per <h2>)."""
+    soup = BeautifulSoup(content, 'html.parser')
+    stories = []
+    for h in soup.find_all('h2'):
+        title = h.get_text(strip=True)
+        paragraphs = []
+        for sib in h.find_next_siblings():
+            if sib.name and sib.name.startswith('h'):
+                break
+            if sib.name == 'p':
+                paragraphs.append(sib.get_text(strip=True))
+        content = title
+        if paragraphs:
+            content += "\n\n" + "\n".join(paragraphs)
+        if content.strip():
+            stories.append(content)
+    return stories
+
+
+# Real-world breakage the extractor must handle exactly like the legacy loop
+MALFORMED_PAGES = {
+    "unclosed_p": b"<p>intro<h2>T1</h2><p>a<p>b<h2>T2</h2><p>c",
+    "h2_in_head": b"<html><head><h2>Oops</h2></head><body><p>x</p></body></html>",
+    "body_in_comment": b"<!-- <body> --><h2>T</h2><p>a</p>",
+    "body_in_script": b"<script>document.write('<body>')</script><h2>T</h2><p>a</p><p>b</p>",
+    "no_html_wrapper": b"<h2>One</h2><p>a</p><h3>Moral</h3><p>skip</p><h2>Two</h2>text<p>b</p>",
+    "nested_divs": b"<div><h2>A</h2><div><p>inner</p></div><p>outer</p></div><h2>B</h2><p>c</p>",
+    "unclosed_div": b"<body><div><h2>A</h2><p>a<div><h2>B</h2><p>b</body>",
+}
+
+
+def synthetic_page(n_stories, paras_per_story=6):
+    parts = [
+        "<html><head><title>Stories</title>",
+        "<style>" + "p{margin:0}" * 500 + "</style>",
+        "<script>" + "var x=1;" * 2000 + "</script></head><body><div class='entry'>",
+    ]
+    for i in range(n_stories):
+        parts.append(f"<h2>Story number {i}</h2>")
+        for j in range(paras_per_story):
+            parts.append(f"<p>Once upon a time, paragraph {j} of story {i} taught a <b>kind</b> lesson.</p>")
+        if i % 5 == 0:
+            parts.append(f"<h3>Moral {i}</h3><p>Be kind.</p>")
+    parts.append("</div></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def load_fixtures():
+    fixtures = list(MALFORMED_PAGES.items())
+    for path in sorted(glob.glob(os.path.join(main.HTTP_CACHE_DIR, "*.body"))):
+        with open(path, "rb") as f:
+            fixtures.append((os.path.basename(path)[:12], f.read()))
+
+    fixture_dir = os.path.join(main.CACHE_DIR, "bench_fixtures")
+    os.makedirs(fixture_dir, exist_ok=True)
+    for n in (50, 500, 3000):
+        path = os.path.join(fixture_dir, f"synthetic_{n}.html")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(synthetic_page(n))
+        with open(path, "rb") as f:
+            fixtures.append((f"synthetic_{n}", f.read()))
+    return fixtures
+
+
+def best_of(fn, content, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    # The default path (restricted html.parser parse), the full BeautifulSoup tree it replaces,
+    # and the configured backend when it is not html.parser
+    variants = [
+        ("default", lambda c: main.parse_stories_from_html(c, parser="html.parser")),
+        ("soup", lambda c: main._parse_stories_with_soup(c, "html.parser")),
+    ]
+    if main.HTML_PARSER != "html.parser":
+        variants.append((main.HTML_PARSER, lambda c: main.parse_stories_from_html(c, parser=main.HTML_PARSER)))
+    header = f"{'fixture':<16}{'KB':>8}{'stories':>9}{'legacy ms':>11}" + "".join(f"{name + ' ms':>16}{'x':>7}" for name, _fn in variants)
+    print(header)
+    print("-" * len(header))
+
+    for name, content in load_fixtures():
+        expected = legacy_parse(content)
+        row = f"{name:<16}{len(content) / 1024:>8.0f}{len(expected):>9}"
+        legacy_t = best_of(legacy_parse, content, args.repeat)
+        row += f"{legacy_t * 1000:>11.1f}"
+        for _variant, fn in variants:
+            if fn(content) != expected:
+                row += f"{'MISMATCH':>16}{'':>7}"
+                continue
+            t = best_of(fn, content, args.repeat)
+            row += f"{t * 1000:>16.1f}{legacy_t / t:>6.1f}x"
+        print(row)
+
+if __name__ == "__main__":
+    main_bench()
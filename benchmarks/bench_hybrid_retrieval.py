@@ -0,0 +1,112 @@
+"""
+Benchmark: BM25 lexical search latency for hybrid retrieval on a large corpus.
+
+Builds a throwaway LexicalIndex with --stories synthetic stories (100k by default) spread
+over 5 categories, with a few named characters ("Tenali Rama", "Birbal", ...) sprinkled in,
+then times LexicalIndex.search for short topic queries with and without a category filter.
+Latencies are compared with LEXICAL_BUDGET_MS, the cap hybrid retrieval enforces on the
+lexical half (queries over budget are aborted and fall back to vector-only ranking).
+The vector half can be measured at the same scale with bench_collection_layout.py
+(--categories 5 --per-category 20000).
+
+Usage: python benchmarks/bench_hybrid_retrieval.py [--stories 100000] [--repeat 20]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+THEMES = ("king minister clever crow river forest kind greedy trader village elephant monkey "
+          "lesson wise honest golden pot farmer festival temple brave child queen merchant "
+          "jackal lion rabbit tortoise hare thirsty water stone mango tree woodcutter").split()
+NAMES = ["Tenali Rama", "Birbal", "Akbar", "Krishna", "Hanuman", "Vikram", "Betaal"]
+QUERIES = ["Tenali Rama", "Birbal", "Akbar Birbal", "Hanuman", "kindness", "greedy trader",
+           "thirsty crow", "honest woodcutter", "lion and rabbit", "golden pot"]
+
+
+def build_index(path, n, seed=11):
+    rng = random.Random(seed)
+    # Zipf-like filler vocabulary so common words behave like they do in real text
+    vocab = [f"w{i}" for i in range(20000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    index = main.LexicalIndex(path)
+    categories = ["mythological", "historical", "moral", "funny", "web"]
+    batch = []
+    start = time.perf_counter()
+    for i in range(n):
+        words = rng.choices(vocab, weights=weights, k=rng.randint(120, 220))
+        # A handful of theme words per story, and a named character in ~2% of them
+        for _ in range(rng.randint(2, 6)):
+            words.insert(rng.randrange(len(words)), rng.choice(THEMES))
+        if rng.random() < 0.02:
+            words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+        batch.append((f"doc_{i}", f"Story {i}", " ".join(words)))
+        if len(batch) == 5000:
+            index.add(categories[(i // 5000) % len(categories)], batch)
+            batch = []
+    if batch:
+        index.add(categories[-1], batch)
+    return index, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--stories", type=int, default=100000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--top-k", type=int, default=3)
+    args = ap.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_bm25_")
+    try:
+        index, build_s = build_index(os.path.join(work_dir, "lexical.sqlite3"), args.stories)
+        print(f"Indexed {args.stories} stories in {build_s:.1f}s "
+              f"({args.stories / build_s:.0f} stories/s); budget {main.LEXICAL_BUDGET_MS} ms\n")
+
+        limit = args.top_k * main.HYBRID_CANDIDATES
+        header = f"{'query':<20}{'filter':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'hits':>6}"
+        print(header)
+        print("-" * len(header))
+        all_samples = []
+        for query in QUERIES:
+            for category in (None, "moral"):
+                samples = []
+                hits = []
+                for _ in range(args.repeat):
+                    t = time.perf_counter()
+                    hits = index.search(query, category, limit=limit)
+                    samples.append((time.perf_counter() - t) * 1000)
+                all_samples.extend(samples)
+                print(f"{query:<20}{category or '-':>8}{percentile(samples, 50):>9.2f}"
+                      f"{percentile(samples, 95):>9.2f}{max(samples):>9.2f}{len(hits):>6}")
+
+        # Fusion itself is pure Python over 2 * limit ids
+        t = time.perf_counter()
+        for _ in range(1000):
+            main.reciprocal_rank_fusion([[f"v{i}" for i in range(limit)], [f"l{i}" for i in range(limit)]])
+        fusion_ms = (time.perf_counter() - t)
+
+        over = sum(1 for s in all_samples if s > main.LEXICAL_BUDGET_MS)
+        print(f"\nOverall p50 {percentile(all_samples, 50):.2f} ms, p95 {percentile(all_samples, 95):.2f} ms, "
+              f"p99 {percentile(all_samples, 99):.2f} ms; {over}/{len(all_samples)} over budget; "
+              f"RRF fusion {fusion_ms:.3f} ms per query")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,102 @@
+"""
+Benchmark: time-to-first-audio and total synthesis time, single-shot vs sentence-chunked.
+
+Synthesizes the same ~500-word story (or --file) with the real speech engine, bypassing the
+audio cache, in two ways:
+  - single:  one job on one TTS worker (the previous generate_audio_file path)
+  - chunked: synthesize_story_audio, sentence chunks spread over --workers worker processes
+             and stitched into one file
+For single-shot the first audio is only available when the whole file is done.
+
+Usage: python benchmarks/bench_tts_chunked.py [--workers 2] [--repeat 3] [--file story.txt]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Worker processes re-import this module; they must reuse the parent's directory
+WORK_DIR = os.environ.get("BENCH_TTS_WORK_DIR") or tempfile.mkdtemp(prefix="bench_tts_")
+os.environ["BENCH_TTS_WORK_DIR"] = WORK_DIR
+os.environ["AI_NANI_CACHE_DIR"] = os.path.join(WORK_DIR, "cache")
+sys.path.insert(0, ROOT)
+
+import main
+
+SENTENCES = [
+    "Once upon a time, a thirsty crow flew over a dry village looking for water.",
+    "At last it found a pot with a little water at the very bottom.",
+    "The crow tried and tried, but its beak could not reach the water.",
+    "Then it had a clever idea and began dropping pebbles into the pot, one by one.",
+    "Slowly the water rose higher and higher until the crow could drink.",
+    "The villagers who watched were amazed at how patient the little bird had been.",
+    "An old grandmother told the children that wisdom often beats strength.",
+]
+
+
+def sample_story(words=500):
+    text = []
+    count = 0
+    i = 0
+    while count < words:
+        sentence = SENTENCES[i % len(SENTENCES)]
+        text.append(sentence)
+        count += len(sentence.split())
+        i += 1
+    return " ".join(text)
+
+
+def main_bench():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=main.TTS_WORKERS)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--file", help="text file to synthesize instead of the built-in story")
+    args = ap.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = sample_story()
+
+    main.TTS_WORKERS = args.workers
+    rows = []
+    try:
+        workers = main.get_tts_workers()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.voice_settings()
+        print(f"{len(workers)} TTS worker(s) ready in {time.perf_counter() - start:.1f}s; "
+              f"{len(text.split())} words in {len(main.split_for_speech(text))} chunks\n")
+
+        for run in range(args.repeat):
+            # Unique suffix per run so neither path can reuse an earlier run's chunks
+            story = f"{text} (Run {run + 1}.)"
+            start = time.perf_counter()
+            workers[0].synthesize(story, use_cache=False).result()
+            single = time.perf_counter() - start
+            rows.append(("single", single, single))
+
+            job = main.synthesize_story_audio(story + " ", use_cache=False)
+            job.result.result()
+            rows.append(("chunked", job.metrics["ttfa"], job.metrics["total"]))
+    finally:
+        for worker in main.get_tts_workers():
+            worker.shutdown()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    header = f"{'path':<10}{'first audio s':>15}{'total s':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, ttfa, total in rows:
+        print(f"{name:<10}{ttfa:>15.2f}{total:>10.2f}")
+    for name in ("single", "chunked"):
+        runs = [r for r in rows if r[0] == name]
+        print(f"{'mean ' + name:<10}{sum(r[1] for r in runs) / len(runs):>15.2f}{sum(r[2] for r in runs) / len(runs):>10.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
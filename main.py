@@ -1,5 +1,24 @@
 import os
+import sys
+import re
+import json
+import hashlib
+import time
+import sqlite3
+import queue
+import signal
+import wave
+import atexit
+import threading
+import multiprocessing
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from bs4 import BeautifulSoup
 import chromadb
 import pyttsx3
@@ -19,9 +38,39 @@ try:
 except Exception:
     PyPDF2 = None
 
+# tiktoken gives exact OpenAI token counts; without it chunk sizes are estimated
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# BeautifulSoup backend for scraped pages. html.parser is the default because lxml repairs
+# malformed markup (e.g. unclosed <p>) differently and so extracts different stories;
+# HTML_PARSER=lxml opts in to that backend when it is installed (it is no faster than the
+# restricted html.parser parse in parse_stories_from_html).
+HTML_PARSER = os.getenv("HTML_PARSER") or "html.parser"
+
+# BeautifulSoup's html.parser tokenizer, reused by the restricted story parser below
+try:
+    from bs4.builder import HTMLParserTreeBuilder
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+    from bs4.dammit import UnicodeDammit
+    from bs4.element import CData
+except Exception:
+    BeautifulSoupHTMLParser = None
+if HTML_PARSER == "lxml":
+    try:
+        import lxml  # noqa: F401
+    except Exception:
+        print("HTML_PARSER=lxml but lxml is not installed; using html.parser")
+        HTML_PARSER = "html.parser"
+
 # PDF folder structure
 PDF_FOLDER = "d:\\App\\AiNani\\stories_pdf"
 
+# Root folder for local caches (override with AI_NANI_CACHE_DIR in .env)
+CACHE_DIR = os.getenv("AI_NANI_CACHE_DIR") or os.path.join(os.path.dirname(__file__), "cache")
+
 # External categories file (one entry per line: key=Display Name)
 CATEGORIES_FILE = os.path.join(os.path.dirname(__file__), "categories.txt")
 
@@ -176,30 +225,59 @@ STORY_URLS = load_story_urls()
 #     "https://www.moralstories.org/a-man-with-a-lamp/"
 # ]
 
-# Function to extract text from PDF
-def extract_text_from_pdf(pdf_path):
+# Generator yielding the text of each PDF page as it is read (raises on unreadable files)
+def iter_pdf_pages(pdf_path):
     if PyPDF2 is None:
         print("PyPDF2 not installed. Skipping PDF extraction.")
-        return ""
-    
+        return
+
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            yield (page.extract_text() or "") + "\n"
+
+# Generator yielding paragraphs (text between blank lines) from a stream of text chunks.
+# Paragraphs that span chunk/page boundaries are stitched together, so the output matches
+# "".join(chunks).split('\n\n') while only the current paragraph is held in memory.
+def iter_paragraphs(chunks):
+    pending = []  # pieces of the paragraph still open
+    tail = ""     # last character seen, to catch a break split across two chunks
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if '\n\n' not in tail + chunk:
+            pending.append(chunk)
+            tail = chunk[-1]
+            continue
+        pending.append(chunk)
+        parts = "".join(pending).split('\n\n')
+        last = parts.pop()
+        yield from parts
+        pending = [last] if last else []
+        tail = last[-1:]
+    yield "".join(pending)
+
+# Function to extract text from PDF
+def extract_text_from_pdf(pdf_path):
     try:
-        text = ""
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+        return "".join(iter_pdf_pages(pdf_path))
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {str(e)}")
         return ""
 
+# Upper bound on a single story; only reached when a PDF has no detectable titles
+STORY_MAX_CHARS = int(os.getenv("STORY_MAX_CHARS") or 12000)
+
 # Function to split PDF text into stories (improved: better segmentation)
 def split_pdf_into_stories(text, pdf_name):
-    stories = []
-    
-    # Split by double newlines as paragraph breaks
-    paragraphs = text.split('\n\n')
-    
+    return list(iter_stories(text.split('\n\n'), pdf_name))
+
+# Stream stories straight from a PDF file, page by page
+def iter_pdf_stories(pdf_path, pdf_name=None):
+    return iter_stories(iter_paragraphs(iter_pdf_pages(pdf_path)), pdf_name or os.path.basename(pdf_path))
+
+# Generator segmenting a stream of paragraphs into stories, emitting each one as soon as it closes
+def iter_stories(paragraphs, pdf_name):
     current_story = ""
     story_title = "Untitled"
     para_count = 0
@@ -223,11 +301,11 @@ def split_pdf_into_stories(text, pdf_name):
         # If we have a complete story and find a new title, save it
         if current_story and is_title and para_count >= 2:
             if len(current_story) > 150:  # Only save substantial stories
-                stories.append({
+                yield {
                     "content": current_story.strip(),
                     "source": pdf_name,
                     "title": story_title
-                })
+                }
             current_story = ""
             para_count = 0
             story_title = para
@@ -246,140 +324,2195 @@ def split_pdf_into_stories(text, pdf_name):
         
         para_count += 1
         
-        # If story gets very long, consider it complete and save
-        if len(current_story) > 1200:
-            stories.append({
+        # Safety valve for text with no detectable titles; stories are cut into
+        # retrieval-sized chunks at ingest time (see chunk_text), not here
+        if len(current_story) > STORY_MAX_CHARS:
+            yield {
                 "content": current_story.strip(),
                 "source": pdf_name,
                 "title": story_title
-            })
+            }
             current_story = ""
             para_count = 0
             story_title = "Untitled"
     
     # Save remaining story
     if current_story and len(current_story) > 150:
-        stories.append({
+        yield {
             "content": current_story.strip(),
             "source": pdf_name,
             "title": story_title
+        }
+
+class IngestCancelled(Exception):
+    """Raised inside an ingestion step when its background job was cancelled."""
+
+# Progress hook shared by the ingestion steps: `progress` is an IngestJob or None.
+# Reporting also checks for cancellation, so long loops stop at the next report.
+def _report(progress, stage=None, **counts):
+    if progress is not None:
+        progress.update(stage, **counts)
+
+# Worker processes for PDF ingestion (0 or 1 = sequential); override with PDF_WORKERS in .env
+PDF_WORKERS = int(os.getenv("PDF_WORKERS") or 0)
+
+# Max seconds a single PDF may spend in a worker in parallel mode; a file over it is
+# abandoned and the worker process killed
+PDF_FILE_TIMEOUT = int(os.getenv("PDF_FILE_TIMEOUT") or 300)
+
+# Cached split results for PDFs, one JSON file per PDF path
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdf_stories")
+
+# Bump whenever iter_stories/iter_paragraphs change so cached splits are rebuilt
+SPLITTER_VERSION = 2
+
+def splitter_id():
+    """Identifies the splitter code and settings (STORY_MAX_CHARS) that produced cached stories."""
+    return f"{SPLITTER_VERSION}:{STORY_MAX_CHARS}"
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _pdf_cache_file(pdf_path):
+    key = hashlib.sha1(os.path.abspath(pdf_path).encode("utf-8")).hexdigest()
+    return os.path.join(PDF_CACHE_DIR, key + ".json")
+
+def _write_json_atomic(path, data):
+    """Write JSON via a temp file + rename so concurrent readers never see partial files."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def sqlite_connect(path):
+    """
+    Open a connection to an SQLite file for one block: commits on success, rolls back on
+    error and always closes (sqlite3's own context manager never closes the connection).
+    """
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def load_cached_pdf_stories(pdf_path):
+    """
+    Return cached stories for pdf_path, or None if the cache is missing or stale.
+    Size + mtime match is trusted as-is; otherwise the content hash decides.
+    """
+    cache_file = _pdf_cache_file(pdf_path)
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("splitter") != splitter_id():
+            return None
+        info = os.stat(pdf_path)
+        if entry.get("size") == info.st_size and entry.get("mtime") == info.st_mtime:
+            return entry["stories"]
+        if entry.get("size") != info.st_size or entry.get("sha256") != file_sha256(pdf_path):
+            return None
+        # Same bytes, new mtime (e.g. file copied or touched): refresh the fingerprint
+        entry["mtime"] = info.st_mtime
+        _write_json_atomic(cache_file, entry)
+        return entry["stories"]
+    except Exception:
+        return None
+
+def save_cached_pdf_stories(pdf_path, stories):
+    """Store the split stories for pdf_path together with its current fingerprint."""
+    try:
+        info = os.stat(pdf_path)
+        _write_json_atomic(_pdf_cache_file(pdf_path), {
+            "path": os.path.abspath(pdf_path),
+            "size": info.st_size,
+            "mtime": info.st_mtime,
+            "sha256": file_sha256(pdf_path),
+            "splitter": splitter_id(),
+            "stories": stories
         })
-    
-    return stories
+    except Exception as e:
+        print(f"Could not cache stories for {pdf_path}: {str(e)}")
+
+def _load_single_pdf(pdf_path, use_cache=True):
+    """Extract and split one PDF. Returns (pdf_file, stories, error) and never raises."""
+    pdf_file = os.path.basename(pdf_path)
+    try:
+        if use_cache:
+            cached = load_cached_pdf_stories(pdf_path)
+            if cached is not None:
+                return pdf_file, cached, None
+        stories = list(iter_pdf_stories(pdf_path, pdf_file))
+        # Only cache real extractions (PyPDF2 missing yields nothing)
+        if use_cache and PyPDF2 is not None:
+            save_cached_pdf_stories(pdf_path, stories)
+        return pdf_file, stories, None
+    except Exception as e:
+        return pdf_file, [], str(e)
+
+# Set in each PDF pool worker: queue the worker reports every file it starts on
+_pdf_started = None
+
+def _pdf_worker_init(pids, started):
+    global _pdf_started
+    _pdf_started = started
+    # Tell the parent which processes belong to the pool so a hung one can be killed
+    pids.put(os.getpid())
+
+def _load_pdf_in_worker(index, pdf_path, use_cache=True):
+    # A future counts as running while it still waits in the executor's call queue, so the
+    # worker reports when it really starts and the parent's clock begins there
+    _pdf_started.put(index)
+    return _load_single_pdf(pdf_path, use_cache)
+
+def _kill_pdf_workers(pids):
+    while True:
+        try:
+            pid = pids.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+def _run_pdf_pool(pdf_paths, workers, results, use_cache=True, progress=None):
+    """
+    Fill results for pdf_paths using one pool. Returns (paths lost to a crashed worker,
+    paths still unfinished when the pool was torn down because a file timed out).
+    """
+    broken = []
+    ctx = multiprocessing.get_context()
+    pids = ctx.Queue()
+    started_queue = ctx.Queue()
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths)), mp_context=ctx,
+                               initializer=_pdf_worker_init, initargs=(pids, started_queue))
+    pending = {}
+    timed_out = False
+    try:
+        indexes = {}
+        for i, path in enumerate(pdf_paths):
+            future = pool.submit(_load_pdf_in_worker, i, path, use_cache)
+            pending[future] = path
+            indexes[future] = i
+        started = {}
+        while pending and not timed_out:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    results[path] = future.result()
+                except BrokenProcessPool:
+                    broken.append(path)
+                except Exception as e:
+                    results[path] = (os.path.basename(path), [], f"{type(e).__name__}: {e}")
+            # A file's clock starts once a worker reports it has begun, so queued files are not charged
+            now = time.monotonic()
+            while True:
+                try:
+                    started.setdefault(started_queue.get_nowait(), now)
+                except queue.Empty:
+                    break
+            for future, path in list(pending.items()):
+                if indexes[future] in started and now - started[indexes[future]] > PDF_FILE_TIMEOUT:
+                    del pending[future]
+                    results[path] = (os.path.basename(path), [], f"timed out after {PDF_FILE_TIMEOUT}s")
+                    timed_out = True
+            _report(progress, files_parsed=len(results))
+    finally:
+        # Anything still pending (a hung file, or cancellation) would keep its worker busy
+        # after shutdown(wait=False), so the workers are killed outright
+        if pending or timed_out:
+            _kill_pdf_workers(pids)
+        pool.shutdown(wait=False, cancel_futures=True)
+    interrupted = [path for path in pending.values() if path not in results]
+    return broken, interrupted
+
+def _load_pdfs_parallel(pdf_paths, workers, use_cache=True, progress=None):
+    """Run _load_single_pdf across a process pool; results come back in input order."""
+    results = {}
+    pending = list(pdf_paths)
+    while pending:
+        # Files interrupted by another file's timeout get a fresh pool; each round settles at
+        # least the file that timed out, so this ends
+        broken, pending = _run_pdf_pool(pending, workers, results, use_cache, progress)
+
+        # A crashing worker takes the whole pool down with it, so retry each affected
+        # file in its own pool to pin the failure on the file that caused it
+        for path in broken:
+            if _run_pdf_pool([path], 1, results, use_cache, progress)[0]:
+                results[path] = (os.path.basename(path), [], "worker process crashed")
+
+    return [results[path] for path in pdf_paths]
 
 # Function to load stories from PDFs by category
-def load_stories_from_pdfs(category):
-    stories = []
+def load_stories_from_pdfs(category, workers=None, use_cache=True, progress=None):
+    """
+    Load and split every PDF in the category folder.
+    workers > 1 extracts files in a process pool; output order is always sorted by file name.
+    Unchanged files are served from the on-disk split cache unless use_cache=False.
+    `progress` (an IngestJob) receives files_total/files_parsed and can cancel the load.
+    """
     category_path = os.path.join(PDF_FOLDER, category)
     
     if not os.path.exists(category_path):
         print(f"Category folder not found: {category_path}")
-        return stories
-    
-    for pdf_file in os.listdir(category_path):
-        if pdf_file.endswith('.pdf'):
-            pdf_path = os.path.join(category_path, pdf_file)
-            print(f"Loading PDF: {pdf_file}")
-            
-            text = extract_text_from_pdf(pdf_path)
-            if text:
-                pdf_stories = split_pdf_into_stories(text, pdf_file)
-                stories.extend(pdf_stories)
-                print(f"Extracted {len(pdf_stories)} stories from {pdf_file}\n")
+        return []
+
+    pdf_paths = [
+        os.path.join(category_path, pdf_file)
+        for pdf_file in sorted(os.listdir(category_path))
+        if pdf_file.endswith('.pdf')
+    ]
+    return load_stories_from_pdf_paths(pdf_paths, workers, use_cache, progress)
+
+# Load and split the given PDF files only (e.g. just the ones that were uploaded)
+def load_stories_from_pdf_paths(pdf_paths, workers=None, use_cache=True, progress=None):
+    stories = []
+    if workers is None:
+        workers = PDF_WORKERS
+
+    _report(progress, "parsing", files_total=len(pdf_paths), files_parsed=0)
+    if workers and workers > 1 and len(pdf_paths) > 1:
+        print(f"Loading {len(pdf_paths)} PDFs with {workers} worker processes...")
+        results = _load_pdfs_parallel(pdf_paths, workers, use_cache, progress)
+    else:
+        results = []
+        for pdf_path in pdf_paths:
+            print(f"Loading PDF: {os.path.basename(pdf_path)}")
+            results.append(_load_single_pdf(pdf_path, use_cache))
+            _report(progress, files_parsed=len(results))
+
+    for pdf_file, pdf_stories, error in results:
+        if error:
+            print(f"Error loading {pdf_file}: {error}\n")
+            continue
+        stories.extend(pdf_stories)
+        print(f"Extracted {len(pdf_stories)} stories from {pdf_file}\n")
     
     return stories
 
+# Content hashes of the PDFs in each category folder, used to skip duplicate uploads. The
+# index (SQLite) is updated as files are saved, so an upload never scans the folder; PDFs
+# that arrived some other way are hashed by the next full load of the category, in its
+# background job (index_category_pdfs).
+PDF_HASH_INDEX_PATH = os.path.join(CACHE_DIR, "pdf_hashes.sqlite3")
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Guards the duplicate lookup + rename into the folder, so two uploads of the same
+# content cannot both be saved
+_pdf_hash_lock = threading.Lock()
+
+def _pdf_hash_index():
+    os.makedirs(os.path.dirname(PDF_HASH_INDEX_PATH), exist_ok=True)
+    return sqlite_connect(PDF_HASH_INDEX_PATH)
+
+def _ensure_pdf_hash_index(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pdf_files (category TEXT NOT NULL, name TEXT NOT NULL, "
+        "sha256 TEXT NOT NULL, size INTEGER, mtime REAL, PRIMARY KEY (category, name))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS pdf_files_hash ON pdf_files (category, sha256)")
+
+def _record_pdf_hash(conn, category, name, sha256, path):
+    info = os.stat(path)
+    conn.execute(
+        "INSERT OR REPLACE INTO pdf_files (category, name, sha256, size, mtime) VALUES (?, ?, ?, ?, ?)",
+        (category, name, sha256, info.st_size, info.st_mtime)
+    )
+
+def index_category_pdfs(category, progress=None):
+    """Hash the category's PDFs that are new or changed since they were indexed; drop missing ones."""
+    category_path = os.path.join(PDF_FOLDER, category)
+    try:
+        names = [name for name in os.listdir(category_path) if name.endswith('.pdf')]
+    except OSError:
+        names = []
+    with _pdf_hash_index() as conn:
+        _ensure_pdf_hash_index(conn)
+        known = {name: (size, mtime) for name, size, mtime in conn.execute(
+            "SELECT name, size, mtime FROM pdf_files WHERE category = ?", (category,))}
+    changed = []
+    for name in names:
+        try:
+            info = os.stat(os.path.join(category_path, name))
+        except OSError:
+            continue
+        if known.get(name) != (info.st_size, info.st_mtime):
+            changed.append(name)
+    hashed = []
+    for name in changed:
+        _report(progress)
+        path = os.path.join(category_path, name)
+        try:
+            hashed.append((name, file_sha256(path), path))
+        except OSError:
+            continue
+    with _pdf_hash_lock, _pdf_hash_index() as conn:
+        for name, sha256, path in hashed:
+            try:
+                _record_pdf_hash(conn, category, name, sha256, path)
+            except OSError:
+                pass
+        present = set(names)
+        missing = [name for name in known if name not in present]
+        conn.executemany("DELETE FROM pdf_files WHERE category = ? AND name = ?",
+                         [(category, name) for name in missing])
+
+def save_uploaded_pdf(category, file_name, stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Stream an uploaded PDF into the category folder in chunks, hashing it on the way.
+    Returns (saved path, None), or (None, existing file name) when the same content is
+    already in the category. A different file with the same name is kept under a new name.
+    Cost depends on the upload's size only, not on how many PDFs the category holds.
+    """
+    category_path = os.path.join(PDF_FOLDER, category)
+    os.makedirs(category_path, exist_ok=True)
+    file_name = os.path.basename(file_name) or "upload.pdf"
+    tmp_path = os.path.join(category_path, f".{file_name}.{os.getpid()}.{threading.get_ident()}.part")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as out:
+            for block in iter(lambda: stream.read(chunk_size), b""):
+                digest.update(block)
+                out.write(block)
+        sha256 = digest.hexdigest()
+
+        with _pdf_hash_lock, _pdf_hash_index() as conn:
+            _ensure_pdf_hash_index(conn)
+            for (existing,) in conn.execute(
+                    "SELECT name FROM pdf_files WHERE category = ? AND sha256 = ?", (category, sha256)).fetchall():
+                if os.path.exists(os.path.join(category_path, existing)):
+                    return None, existing
+                # Deleted since it was indexed
+                conn.execute("DELETE FROM pdf_files WHERE category = ? AND name = ?", (category, existing))
+
+            stem, ext = os.path.splitext(file_name)
+            dest_name = file_name
+            n = 2
+            while os.path.exists(os.path.join(category_path, dest_name)):
+                dest_name = f"{stem} ({n}){ext or '.pdf'}"
+                n += 1
+            dest_path = os.path.join(category_path, dest_name)
+            os.replace(tmp_path, dest_path)
+            _record_pdf_hash(conn, category, dest_name, sha256, dest_path)
+        return dest_path, None
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+# Web scraping settings
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS") or 8)  # concurrent fetches (1 = sequential)
+SCRAPE_PER_HOST_LIMIT = 4     # max in-flight requests to any single host
+SCRAPE_TIMEOUT = 10           # per-request timeout in seconds
+SCRAPE_RETRIES = 2            # extra attempts on connection errors, 429 and 5xx
+SCRAPE_BACKOFF = 0.5          # base delay in seconds, doubled on each retry
+SCRAPE_DEADLINE = 60          # total seconds allowed for one scrape_stories() call
+SCRAPE_USER_AGENT = "AI-Nani/1.0 (+https://github.com/routsarojkumar/AI-NANI)"
+
+_http_session = None
+_host_semaphores = {}
+_http_lock = threading.Lock()
+
+def get_http_session():
+    """Return the shared keep-alive requests.Session used for scraping."""
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=SCRAPE_WORKERS, pool_maxsize=max(SCRAPE_WORKERS, SCRAPE_PER_HOST_LIMIT))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = SCRAPE_USER_AGENT
+                _http_session = session
+    return _http_session
+
+def _host_semaphore(url):
+    host = urlsplit(url).netloc.lower()
+    with _http_lock:
+        sem = _host_semaphores.get(host)
+        if sem is None:
+            sem = threading.BoundedSemaphore(SCRAPE_PER_HOST_LIMIT)
+            _host_semaphores[host] = sem
+    return sem
+
+def fetch_url(url, session=None, timeout=SCRAPE_TIMEOUT, retries=SCRAPE_RETRIES,
+              backoff=SCRAPE_BACKOFF, deadline=None, headers=None):
+    """
+    GET a URL through the shared session, honouring the per-host limit.
+    Retries connection errors, 429 and 5xx with exponential backoff, never past
+    `deadline` (a time.monotonic() value). Raises on final failure or HTTP error.
+    """
+    session = session or get_http_session()
+    attempt = 0
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"deadline exceeded before fetching {url}")
+        request_timeout = timeout if remaining is None else min(timeout, remaining)
+
+        error = None
+        try:
+            with _host_semaphore(url):
+                response = session.get(url, timeout=request_timeout, headers=headers)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response
+            error = requests.HTTPError(f"{response.status_code} for url: {url}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        delay = backoff * (2 ** attempt)
+        if attempt >= retries or (deadline is not None and time.monotonic() + delay >= deadline):
+            raise error
+        time.sleep(delay)
+        attempt += 1
+
+# Bump whenever parse_stories_from_html output changes so cached parses are rebuilt
+HTML_EXTRACTOR_VERSION = 2
+
+def html_extractor_id(parser=None):
+    """Identifies the parser + extraction code that produced cached stories."""
+    return f"{HTML_EXTRACTOR_VERSION}:{parser or HTML_PARSER}"
+
+# Parse stories out of a story page: each <h2> plus the <p> siblings until the next heading.
+# Siblings are walked lazily, so every element is visited at most once (linear in page size).
+# The whole document is parsed: headings outside <body> count, as they always did.
+# With html.parser (the default) the page goes through the restricted parser below, which
+# produces the same stories without building a BeautifulSoup tree; other backends and
+# bs4 versions it cannot drive use BeautifulSoup itself.
+def parse_stories_from_html(content, parser=None):
+    parser = parser or HTML_PARSER
+    if parser == "html.parser" and BeautifulSoupHTMLParser is not None:
+        try:
+            return _parse_stories_restricted(content)
+        except Exception:
+            pass
+    return _parse_stories_with_soup(content, parser)
+
+def _parse_stories_with_soup(content, parser):
+    soup = BeautifulSoup(content, parser)
+
+    stories = []
+    # Find headings and grab following paragraphs until next heading
+    for h in soup.find_all('h2'):
+        title = h.get_text(strip=True)
+        paragraphs = []
+        for sib in h.next_siblings:
+            if not sib.name:
+                continue
+            if sib.name.startswith('h'):
+                break
+            if sib.name == 'p':
+                paragraphs.append(sib.get_text(strip=True))
+        content = title
+        if paragraphs:
+            content += "\n\n" + "\n".join(paragraphs)
+        if content.strip():
+            stories.append(content)
+    return stories
+
+# Restricted parse: BeautifulSoup's own html.parser front end (tokenizer, entity and
+# character reference handling, void elements) feeding a minimal tree builder that follows
+# BeautifulSoup's nesting rules but keeps only tag names, document order and the strings
+# get_text() would return for <h2>/<p>. Tree building is most of a full parse, so this is
+# where the time goes on ordinary pages.
+class _StoryNode:
+    __slots__ = ("name", "parent", "index", "children", "is_empty_element")
+
+    def __init__(self, name, parent, is_empty_element=False):
+        self.name = name
+        self.parent = parent
+        self.index = len(parent.children) if parent is not None else 0
+        self.children = []
+        self.is_empty_element = is_empty_element
+
+    def text(self):
+        """get_text(strip=True) of the node."""
+        # Depth-first in document order without recursion (unclosed tags nest deeply)
+        parts = []
+        pending = self.children[::-1]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, str):
+                item = item.strip()
+                if item:
+                    parts.append(item)
+            else:
+                pending.extend(reversed(item.children))
+        return "".join(parts)
+
+class _StoryTreeBuilder:
+    """Stands in for the BeautifulSoup object that BeautifulSoupHTMLParser reports to."""
+
+    def __init__(self):
+        self.builder = HTMLParserTreeBuilder()
+        self.root = _StoryNode("[document]", None)
+        self.stack = [self.root]
+        self.open_counts = {}
+        self.containers = []  # open script/style/template/rt/rp tags: their strings are not text
+        self.data = []
+        self.headings = []
+        self.contains_replacement_characters = False
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs, sourceline=None, sourcepos=None, namespaces=None):
+        self.endData()
+        parent = self.stack[-1]
+        node = _StoryNode(name, parent, self.builder.can_be_empty_element(name))
+        parent.children.append(node)
+        self.stack.append(node)
+        self.open_counts[name] = self.open_counts.get(name, 0) + 1
+        if name in self.builder.string_containers:
+            self.containers.append(node)
+        if name == "h2":
+            self.headings.append(node)
+        return node
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+        # Pop up to and including the most recent open tag with this name, if there is one
+        if not self.open_counts.get(name):
+            return
+        while len(self.stack) > 1:
+            node = self.stack.pop()
+            self.open_counts[node.name] -= 1
+            if self.containers and self.containers[-1] is node:
+                self.containers.pop()
+            if node.name == name:
+                break
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        # Plain strings outside script/style/template/rt/rp, and CDATA, are text; comments,
+        # doctypes and processing instructions are not
+        if (containerClass is None and not self.containers) or containerClass is CData:
+            self.stack[-1].children.append(text)
+
+class _StoryHTMLParser(BeautifulSoupHTMLParser or object):
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        # BeautifulSoupHTMLParser.handle_starttag without building the (unused) attributes
+        node = self.soup.handle_starttag(tag, None, None, None)
+        if node.is_empty_element and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed_empty_element.append(tag)
+
+def _parse_stories_restricted(content):
+    if not isinstance(content, str):
+        # Same encoding detection as BeautifulSoup(content, "html.parser")
+        content = UnicodeDammit(content, known_definite_encodings=[], user_encodings=[],
+                                is_html=True, exclude_encodings=None).unicode_markup
+    tree = _StoryTreeBuilder()
+    parser = _StoryHTMLParser(tree, convert_charrefs=False)
+    parser.feed(content)
+    parser.close()
+    tree.endData()
+
+    stories = []
+    for h in tree.headings:
+        title = h.text()
+        paragraphs = []
+        siblings = h.parent.children
+        for i in range(h.index + 1, len(siblings)):
+            sib = siblings[i]
+            if isinstance(sib, str):
+                continue
+            if sib.name.startswith('h'):
+                break
+            if sib.name == 'p':
+                paragraphs.append(sib.text())
+        story = title
+        if paragraphs:
+            story += "\n\n" + "\n".join(paragraphs)
+        if story.strip():
+            stories.append(story)
+    return stories
+
+# HTTP cache for scraped pages: raw body + parsed stories + validators, keyed by URL
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, "http")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES") or 50 * 1024 * 1024)
+
+# Serve web stories only from the HTTP cache, never touching the network
+SCRAPE_OFFLINE = os.getenv("SCRAPE_OFFLINE", "").lower() in ("1", "true", "yes")
+
+_http_cache_lock = threading.Lock()
+
+def _http_cache_paths(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(HTTP_CACHE_DIR, key + ".json"), os.path.join(HTTP_CACHE_DIR, key + ".body")
+
+def load_http_cache(url):
+    """
+    Return the cached entry for url ({etag, last_modified, body_sha256, stories, ...}) or None.
+    Stories parsed by another parser or extractor version are re-parsed from the cached
+    body; without the body the entry counts as a miss.
+    """
+    meta_path, body_path = _http_cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("url") != url:
+            return None
+        if entry.get("extractor") != html_extractor_id():
+            with open(body_path, "rb") as f:
+                entry["stories"] = parse_stories_from_html(f.read())
+            entry["extractor"] = html_extractor_id()
+            _write_json_atomic(meta_path, entry)
+        # mtime doubles as the LRU timestamp
+        os.utime(meta_path)
+        return entry
+    except Exception:
+        return None
+
+def save_http_cache(url, response, body_sha256, stories):
+    """Store the raw body, validators and parsed stories for url, then enforce the size cap."""
+    meta_path, body_path = _http_cache_paths(url)
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        tmp_body = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_body, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_body, body_path)
+        _write_json_atomic(meta_path, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_sha256": body_sha256,
+            "fetched_at": time.time(),
+            "extractor": html_extractor_id(),
+            "stories": stories
+        })
+        evict_http_cache()
+    except Exception as e:
+        print(f"Could not cache {url}: {str(e)}")
+
+def _touch_http_cache(url, entry, response=None):
+    """Refresh validators/timestamp of an entry that was confirmed unchanged."""
+    meta_path, _body_path = _http_cache_paths(url)
+    if response is not None:
+        entry["etag"] = response.headers.get("ETag") or entry.get("etag")
+        entry["last_modified"] = response.headers.get("Last-Modified") or entry.get("last_modified")
+    entry["fetched_at"] = time.time()
+    try:
+        _write_json_atomic(meta_path, entry)
+    except Exception:
+        pass
+
+def evict_http_cache(max_bytes=None):
+    """Delete least recently used cache entries until the cache fits in max_bytes."""
+    if max_bytes is None:
+        max_bytes = HTTP_CACHE_MAX_BYTES
+    with _http_cache_lock:
+        try:
+            names = os.listdir(HTTP_CACHE_DIR)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(HTTP_CACHE_DIR, name)
+            body_path = meta_path[:-len(".json")] + ".body"
+            try:
+                size = os.path.getsize(meta_path)
+                if os.path.exists(body_path):
+                    size += os.path.getsize(body_path)
+                entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+                total += size
+            except OSError:
+                continue
+        entries.sort()
+        for _mtime, size, meta_path, body_path in entries:
+            if total <= max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+def _scrape_one(url, deadline=None, use_cache=True, offline=False):
+    """Fetch and parse one URL. Returns (stories, error) and never raises."""
+    entry = load_http_cache(url) if use_cache or offline else None
+    if offline:
+        if entry is None:
+            print(f"Failed to scrape {url}: not in offline cache\n")
+            return [], "not cached"
+        print(f"Loaded {len(entry['stories'])} cached stories from {url}\n")
+        return entry["stories"], None
+
+    try:
+        print(f"Scraping from: {url}")
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = fetch_url(url, deadline=deadline, headers=headers or None)
+
+        if entry and response.status_code == 304:
+            _touch_http_cache(url, entry)
+            print(f"Not modified, reusing {len(entry['stories'])} cached stories from {url}\n")
+            return entry["stories"], None
+
+        body_sha256 = hashlib.sha256(response.content).hexdigest()
+        if entry and entry.get("body_sha256") == body_sha256:
+            _touch_http_cache(url, entry, response)
+            print(f"Unchanged, reusing {len(entry['stories'])} cached stories from {url}\n")
+            return entry["stories"], None
+
+        stories = parse_stories_from_html(response.content)
+        if use_cache:
+            save_http_cache(url, response, body_sha256, stories)
+        print(f"Successfully scraped {len(stories)} stories from {url}\n")
+        return stories, None
+    except Exception as e:
+        print(f"Failed to scrape {url}: {str(e)}\n")
+        return [], str(e)
+
 # Update scrape_stories to accept optional urls parameter and use it
-def scrape_stories(urls=None):
+def scrape_stories(urls=None, workers=None, deadline=SCRAPE_DEADLINE, use_cache=True, offline=None, progress=None):
+    """
+    Scrape stories from every URL (story_urls.txt by default).
+    URLs are fetched concurrently by `workers` threads (SCRAPE_WORKERS by default)
+    within a total `deadline` in seconds; results keep the input URL order and a
+    failing URL only loses its own stories.
+    Cached pages are revalidated with ETag/If-Modified-Since and only re-parsed when
+    the body changed; offline=True (or SCRAPE_OFFLINE) serves from the cache only.
+    `progress` (an IngestJob) receives files_total/files_parsed (pages) and can cancel.
+    """
     if urls is None:
         urls = load_story_urls()
+    if workers is None:
+        workers = SCRAPE_WORKERS
+    if offline is None:
+        offline = SCRAPE_OFFLINE
+    end_time = time.monotonic() + deadline if deadline else None
+
+    results = {}
+    _report(progress, "fetching", files_total=len(urls), files_parsed=0)
+    if workers <= 1 or len(urls) <= 1:
+        for url in urls:
+            results[url] = _scrape_one(url, end_time, use_cache, offline)
+            _report(progress, files_parsed=len(results))
+    else:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(urls)))
+        try:
+            futures = {pool.submit(_scrape_one, url, end_time, use_cache, offline): url for url in urls}
+            not_done = set(futures)
+            while not_done:
+                timeout = None if end_time is None else max(0, end_time - time.monotonic())
+                done, not_done = wait(not_done, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    results[futures[future]] = future.result()
+                _report(progress, files_parsed=len(results))
+            for future in not_done:
+                print(f"Failed to scrape {futures[future]}: total deadline of {deadline}s exceeded\n")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     all_stories = []
-    
     for url in urls:
-        try:
-            print(f"Scraping from: {url}")
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            stories = []
-            # Find headings and grab following paragraphs until next heading
-            for h in soup.find_all('h2'):
-                title = h.get_text(strip=True)
-                paragraphs = []
-                for sib in h.find_next_siblings():
-                    if sib.name and sib.name.startswith('h'):
-                        break
-                    if sib.name == 'p':
-                        paragraphs.append(sib.get_text(strip=True))
-                content = title
-                if paragraphs:
-                    content += "\n\n" + "\n".join(paragraphs)
-                if content.strip():
-                    stories.append(content)
-            
-            # Add source URL metadata to each story
-            for story in stories:
-                all_stories.append({
-                    "content": story,
-                    "source": url
-                })
-            
-            print(f"Successfully scraped {len(stories)} stories from this URL.\n")
-        
-        except Exception as e:
-            print(f"Failed to scrape {url}: {str(e)}\n")
-            continue
+        stories, _error = results.get(url, ([], "deadline exceeded"))
+        # Add source URL metadata to each story
+        for story in stories:
+            all_stories.append({
+                "content": story,
+                "source": url
+            })
 
     return all_stories
 
-# Function to store stories in ChromaDB by category
-def store_in_chromadb(stories, category="web"):
-    client = chromadb.Client()
-    collection_name = f"stories_{category}"
-    
+# Local embedding layer used for both ingest and queries.
+#   "onnx"                  Chroma's bundled all-MiniLM-L6-v2 ONNX model (same vectors as Chroma's default)
+#   "sentence-transformers" any sentence-transformers model named by EMBEDDING_MODEL (optional package)
+#   "chroma"                leave embedding to the collection's implicit embedding function (no cache)
+EMBEDDING_BACKEND = (os.getenv("EMBEDDING_BACKEND") or "onnx").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE") or 64)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS") or 0)  # 0 = library default
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+# Directory holding model.onnx + tokenizer.json for the onnx backend (e.g. a copy of Chroma's
+# all-MiniLM-L6-v2 download). When set, the model runs in our own ONNX session, which is
+# what lets EMBEDDING_THREADS take effect; otherwise Chroma's embedding function is used as is.
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR") or ""
+
+# The vector space Chroma's default embedding function (and the onnx backend) produces
+DEFAULT_EMBEDDING_SPACE = "all-MiniLM-L6-v2"
+
+class OnnxMiniLM:
+    """
+    MiniLM sentence embeddings from a local model directory in our own ONNX Runtime session:
+    tokenize (256 tokens, padded), mean-pool over the attention mask and L2-normalize, the
+    same steps Chroma's ONNXMiniLM_L6_V2 performs.
+    """
+
+    MAX_TOKENS = 256
+
+    def __init__(self, model_dir, threads=0):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        self.np = np
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.MAX_TOKENS)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]", length=self.MAX_TOKENS)
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"], sess_options=options
+        )
+
+    def __call__(self, texts):
+        np = self.np
+        encoded = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        last_hidden_state = self.session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        })[0]
+        mask = np.broadcast_to(np.expand_dims(attention_mask, -1), last_hidden_state.shape)
+        vectors = np.sum(last_hidden_state * mask, 1) / np.clip(mask.sum(1), a_min=1e-9, a_max=None)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1e-12, norms)
+
+class StoryEmbedder:
+    """
+    Batched CPU embedder with a persistent content-hash -> vector cache (SQLite),
+    so identical stories and repeated queries are only ever embedded once.
+    """
+
+    # Keys per SELECT ... IN (...) lookup (SQLite's host-parameter limit is 999 on old builds)
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, backend=EMBEDDING_BACKEND, model=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE,
+                 threads=EMBEDDING_THREADS, cache_path=EMBEDDING_CACHE_PATH):
+        self.backend = backend
+        # The onnx backend always runs the MiniLM model Chroma uses by default
+        self.model_name = DEFAULT_EMBEDDING_SPACE if backend == "onnx" else model
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self._model = None
+        self._model_lock = threading.Lock()
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connect(self):
+        return sqlite_connect(self.cache_path)
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.backend}:{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load_model(self):
+        if self._model is not None:
+            return self._model
+        with self._model_lock:
+            if self._model is not None:
+                return self._model
+            if self.backend == "sentence-transformers":
+                from sentence_transformers import SentenceTransformer
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+            elif EMBEDDING_MODEL_DIR:
+                self._model = OnnxMiniLM(EMBEDDING_MODEL_DIR, self.threads)
+            else:
+                from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+                if self.threads:
+                    print("EMBEDDING_THREADS needs EMBEDDING_MODEL_DIR; using ONNX Runtime's default threads")
+                self._model = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        return self._model
+
+    def _encode(self, texts):
+        """Embed texts with the backend model, batch_size texts per forward pass."""
+        model = self._load_model()
+        if self.backend == "sentence-transformers":
+            vectors = model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False)
+            return [list(map(float, v)) for v in vectors]
+        vectors = []
+        for batch in _batched(texts, self.batch_size):
+            vectors.extend(list(map(float, v)) for v in model(batch))
+        return vectors
+
+    def _cache_get(self, keys):
+        found = {}
+        if not self.cache_path or not keys:
+            return found
+        try:
+            with self._connect() as conn:
+                for chunk in _batched(keys, self.LOOKUP_CHUNK):
+                    placeholders = ",".join("?" * len(chunk))
+                    for key, blob in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk):
+                        found[key] = _unpack_vector(blob)
+        except sqlite3.Error as e:
+            print(f"Embedding cache read failed: {str(e)}")
+        return found
+
+    def _cache_put(self, items):
+        if not self.cache_path or not items:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, _pack_vector(vector)) for key, vector in items]
+                )
+        except sqlite3.Error as e:
+            print(f"Embedding cache write failed: {str(e)}")
+
+    def embed(self, texts):
+        """Return one vector per text, embedding only texts never seen before."""
+        texts = list(texts)
+        keys = [self._key(t) for t in texts]
+        vectors = self._cache_get(list(set(keys)))
+
+        # Each distinct uncached text is embedded once, even if repeated in this call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            new_vectors = self._encode(list(missing.values()))
+            fresh = list(zip(missing.keys(), new_vectors))
+            self._cache_put(fresh)
+            vectors.update(fresh)
+        return [vectors[key] for key in keys]
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "backend": self.backend, "model": self.model_name}
+
+def _pack_vector(vector):
+    return array("f", vector).tobytes()
+
+def _unpack_vector(blob):
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """Return the shared StoryEmbedder (None when EMBEDDING_BACKEND=chroma)."""
+    global _embedder
+    if EMBEDDING_BACKEND == "chroma":
+        return None
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = StoryEmbedder()
+    return _embedder
+
+def set_embedder(embedder):
+    """Swap in a different embedder (any object with embed(texts)); used by benchmarks."""
+    global _embedder
+    _embedder = embedder
+
+def embedding_space():
+    """Name of the vector space new embeddings are written in (recorded on every collection)."""
+    embedder = get_embedder()
+    return getattr(embedder, "model_name", None) or DEFAULT_EMBEDDING_SPACE
+
+def collection_embedding_space(collection):
+    # Collections from before spaces were recorded were filled by Chroma's default function
+    return (collection.metadata or {}).get("embedder") or DEFAULT_EMBEDDING_SPACE
+
+def check_embedding_space(collection):
+    """Refuse to mix vectors from different embedding models in one collection."""
+    stored = collection_embedding_space(collection)
+    if stored != embedding_space():
+        raise ValueError(
+            f"Collection {collection.name} holds {stored} embeddings but the configured embedder "
+            f"is {embedding_space()}; re-ingest into a fresh CHROMA_DB_PATH or switch EMBEDDING_BACKEND back"
+        )
+
+def _embedding_args(documents):
+    """Extra upsert kwargs: explicit embeddings from the local layer, or none for Chroma's default."""
+    embedder = get_embedder()
+    return {"embeddings": embedder.embed(documents)} if embedder is not None else {}
+
+def _query_args(queries):
+    """query() kwargs for a list of query strings."""
+    embedder = get_embedder()
+    if embedder is None:
+        return {"query_texts": queries}
+    return {"query_embeddings": embedder.embed(queries)}
+
+# ChromaDB on-disk store (override with CHROMA_DB_PATH in .env)
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH") or os.path.join(os.path.dirname(__file__), "chroma_db")
+
+# One client and one handle per collection for the whole process
+_chroma_client = None
+_chroma_collections = {}
+_chroma_lock = threading.Lock()
+
+def get_chroma_client():
+    """Return the shared persistent ChromaDB client, creating it on first use."""
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_lock:
+            if _chroma_client is None:
+                os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+                _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    return _chroma_client
+
+# Collection layout: "per_category" (one stories_<category> collection each, the default)
+# or "unified" (one stories_all collection filtered on the "category" metadata field).
+# Existing per-category stores can be copied over with migrate_to_unified_layout().
+CHROMA_LAYOUT = (os.getenv("CHROMA_LAYOUT") or "per_category").lower()
+UNIFIED_COLLECTION = "stories_all"
+
+def collection_name_for(category, layout=None):
+    """Name of the Chroma collection holding a category's stories."""
+    if (layout or CHROMA_LAYOUT) == "unified":
+        return UNIFIED_COLLECTION
+    return f"stories_{category}"
+
+def category_filter(category, where=None):
+    """Chroma `where` clause for a category query (only needed in the unified layout)."""
+    clauses = []
+    if CHROMA_LAYOUT == "unified" and category is not None:
+        clauses.append({"category": category})
+    if where:
+        clauses.append(where)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def get_story_collection(category="web", create=True):
+    """Return the cached collection handle for a category (None if missing and create=False)."""
+    collection_name = collection_name_for(category)
+    collection = _chroma_collections.get(collection_name)
+    if collection is not None:
+        return collection
+
+    client = get_chroma_client()
+    with _chroma_lock:
+        collection = _chroma_collections.get(collection_name)
+        if collection is not None:
+            return collection
+        try:
+            if create:
+                collection = client.get_or_create_collection(
+                    name=collection_name, metadata={"embedder": embedding_space()}
+                )
+            else:
+                collection = client.get_collection(name=collection_name)
+        except Exception:
+            return None
+        check_embedding_space(collection)
+        _chroma_collections[collection_name] = collection
+    return collection
+
+def reset_collection_cache(category=None):
+    """Forget cached collection handles (all, or just one category)."""
+    with _chroma_lock:
+        if category is None:
+            _chroma_collections.clear()
+        else:
+            _chroma_collections.pop(collection_name_for(category), None)
+    if category is None:
+        clear_retrieval_cache()
+    else:
+        bump_collection_version(category)
+
+# Our own SQLite side indexes live under CACHE_DIR, never inside the Chroma-owned directory;
+# each Chroma store gets its own files so switching CHROMA_DB_PATH never mixes them up
+CHROMA_STORE_KEY = hashlib.sha1(os.path.abspath(CHROMA_DB_PATH).encode("utf-8")).hexdigest()[:12]
+
+# BM25 lexical index (SQLite FTS5) mirroring the Chroma store, synced by store_in_chromadb
+LEXICAL_INDEX_PATH = os.path.join(CACHE_DIR, "lexical", f"{CHROMA_STORE_KEY}.sqlite3")
+
+# Retrieval mode: "vector" (Chroma only) or "hybrid" (BM25 + vector, reciprocal rank fusion)
+RETRIEVAL_MODE = (os.getenv("RETRIEVAL_MODE") or "vector").lower()
+HYBRID_CANDIDATES = 4   # each ranker contributes top_k * HYBRID_CANDIDATES candidates
+RRF_K = 60              # reciprocal rank fusion constant
+# Latency budget for the lexical half of a hybrid query. SQLite aborts the BM25 query once
+# it is exceeded and the vector ranking is used alone, so hybrid stays within vector
+# latency + LEXICAL_BUDGET_MS even on a 100k-story corpus (see benchmarks/bench_hybrid_retrieval.py).
+LEXICAL_BUDGET_MS = int(os.getenv("LEXICAL_BUDGET_MS") or 100)
+
+class LexicalIndex:
+    """Incrementally updated BM25 inverted index over stories (SQLite FTS5, external content)."""
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS lexical_docs (
+                    rowid INTEGER PRIMARY KEY,
+                    doc_id TEXT UNIQUE NOT NULL,
+                    category TEXT NOT NULL,
+                    title TEXT,
+                    content TEXT
+                );
+                CREATE INDEX IF NOT EXISTS lexical_docs_category ON lexical_docs (category);
+                CREATE VIRTUAL TABLE IF NOT EXISTS lexical_fts USING fts5(
+                    title, content, content='lexical_docs', content_rowid='rowid',
+                    tokenize='porter unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS lexical_docs_ai AFTER INSERT ON lexical_docs BEGIN
+                    INSERT INTO lexical_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS lexical_docs_ad AFTER DELETE ON lexical_docs BEGIN
+                    INSERT INTO lexical_fts (lexical_fts, rowid, title, content)
+                    VALUES ('delete', old.rowid, old.title, old.content);
+                END;
+            """)
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def ids(self, category):
+        """Doc ids currently indexed for a category."""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT doc_id FROM lexical_docs WHERE category = ?", (category,))}
+
+    def add(self, category, rows):
+        """Index (doc_id, title, content) rows; existing doc ids are left as they are."""
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO lexical_docs (doc_id, category, title, content) VALUES (?, ?, ?, ?)",
+                [(doc_id, category, title, content) for doc_id, title, content in rows]
+            )
+
+    def remove(self, doc_ids):
+        if not doc_ids:
+            return
+        with self._connect() as conn:
+            for batch in _batched(list(doc_ids), 500):
+                conn.execute(f"DELETE FROM lexical_docs WHERE doc_id IN ({','.join('?' * len(batch))})", batch)
+
+    def search(self, query, category=None, limit=10, budget_ms=None):
+        """
+        Best BM25 matches for any query term, as [(doc_id, content)] best first.
+        Raises sqlite3.OperationalError if the query runs past budget_ms.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        sql = (
+            "SELECT d.doc_id, d.content FROM lexical_fts "
+            "JOIN lexical_docs d ON d.rowid = lexical_fts.rowid "
+            "WHERE lexical_fts MATCH ?"
+        )
+        params = [match]
+        if category is not None:
+            sql += " AND d.category = ?"
+            params.append(category)
+        # Title matches weigh twice as much as body matches
+        sql += " ORDER BY bm25(lexical_fts, 2.0, 1.0) LIMIT ?"
+        params.append(limit)
+
+        with self._connect() as conn:
+            if budget_ms:
+                deadline = time.perf_counter() + budget_ms / 1000.0
+                conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, 1000)
+            return conn.execute(sql, params).fetchall()
+
+_lexical_index = None
+
+def get_lexical_index():
+    """Return the shared LexicalIndex, or None if SQLite lacks FTS5."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _chroma_lock:
+            if _lexical_index is None:
+                try:
+                    _lexical_index = LexicalIndex()
+                except sqlite3.Error as e:
+                    print(f"Lexical index unavailable ({str(e)}); hybrid retrieval will use vectors only.")
+                    _lexical_index = False
+    return _lexical_index or None
+
+def sync_lexical_index(category, entries, prune=True):
+    """Bring the category's lexical index in line with {doc_id: {"document", "metadata"}}."""
+    index = get_lexical_index()
+    if index is None:
+        return
     try:
-        collection = client.get_collection(name=collection_name)
-    except Exception:
-        collection = client.create_collection(name=collection_name)
+        # Without pruning there is no need to list the whole category: add() skips known ids
+        indexed = index.ids(category) if prune else set()
+        index.add(category, [
+            (doc_id, entry["metadata"].get("title", ""), entry["document"])
+            for doc_id, entry in entries.items() if doc_id not in indexed
+        ])
+        if prune:
+            index.remove([doc_id for doc_id in indexed if doc_id not in entries])
+    except sqlite3.Error as e:
+        print(f"Lexical index update failed for {category}: {str(e)}")
+
+# Story catalog for browsing: one row per story (not per chunk) with a title/source search
+# index, so the Browse tab can page and filter in SQL and fetch full text only on demand.
+# Kept under CACHE_DIR (keyed by the Chroma store it mirrors), out of the Chroma directory.
+STORY_CATALOG_PATH = os.path.join(CACHE_DIR, "catalog", f"{CHROMA_STORE_KEY}.sqlite3")
+BROWSE_PAGE_SIZE = int(os.getenv("BROWSE_PAGE_SIZE") or 20)
+
+class StoryCatalog:
+    """Per-category list of stored stories, searchable by title and source (FTS5 prefix index)."""
+
+    def __init__(self, path=STORY_CATALOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS stories (
+                    rowid INTEGER PRIMARY KEY,
+                    story_id TEXT UNIQUE NOT NULL,
+                    category TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    title TEXT,
+                    source TEXT,
+                    length INTEGER,
+                    content TEXT
+                );
+                CREATE INDEX IF NOT EXISTS stories_category_position ON stories (category, position);
+            """)
+            try:
+                conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(
+                        title, source, content='stories', content_rowid='rowid',
+                        tokenize='unicode61', prefix='1 2 3'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS stories_ai AFTER INSERT ON stories BEGIN
+                        INSERT INTO stories_fts (rowid, title, source) VALUES (new.rowid, new.title, new.source);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS stories_ad AFTER DELETE ON stories BEGIN
+                        INSERT INTO stories_fts (stories_fts, rowid, title, source)
+                        VALUES ('delete', old.rowid, old.title, old.source);
+                    END;
+                """)
+                self.fts = True
+            except sqlite3.Error:
+                # No FTS5: filtering falls back to a LIKE scan over the category
+                self.fts = False
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def sync(self, category, stories, prune=True):
+        """
+        Record [(story_id, title, source, content)] for a category. With prune=True the list is
+        the whole category (in display order) and other stories are dropped; otherwise the
+        stories are appended after the ones already listed.
+        """
+        with self._connect() as conn:
+            if prune:
+                keep = {row[0] for row in stories}
+                stale = [sid for (sid,) in conn.execute("SELECT story_id FROM stories WHERE category = ?", (category,))
+                         if sid not in keep]
+                for batch in _batched(stale, 500):
+                    conn.execute(f"DELETE FROM stories WHERE story_id IN ({','.join('?' * len(batch))})", batch)
+                first = 0
+            else:
+                first = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM stories WHERE category = ?",
+                                     (category,)).fetchone()[0]
+            rows = [(sid, category, first + i, title, source, len(content), content)
+                    for i, (sid, title, source, content) in enumerate(stories)]
+            conn.executemany(
+                "INSERT OR IGNORE INTO stories (story_id, category, position, title, source, length, content) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            if prune:
+                conn.executemany("UPDATE stories SET position = ? WHERE story_id = ?",
+                                 [(row[2], row[0]) for row in rows])
+
+    def _filter_sql(self, category, query):
+        terms = re.findall(r"\w+", (query or "").lower())
+        if not terms:
+            return "FROM stories s WHERE s.category = ?", [category]
+        if self.fts:
+            match = " AND ".join(f'"{t}"*' for t in dict.fromkeys(terms))
+            # The FTS subquery drives the lookup; joining the other way scans the whole table
+            return ("FROM stories s WHERE s.rowid IN (SELECT rowid FROM stories_fts WHERE stories_fts MATCH ?) "
+                    "AND s.category = ?"), [match, category]
+        sql = "FROM stories s WHERE s.category = ?"
+        params = [category]
+        for t in dict.fromkeys(terms):
+            sql += " AND (LOWER(s.title) LIKE ? OR LOWER(s.source) LIKE ?)"
+            params += [f"%{t}%", f"%{t}%"]
+        return sql, params
+
+    def page(self, category, query="", page=0, page_size=BROWSE_PAGE_SIZE):
+        """
+        One page of a category's stories whose title or source matches every query word
+        (prefix match). Returns (total matches, [{"id", "title", "source", "length"}]);
+        story text is not read, use text() for that.
+        """
+        where, params = self._filter_sql(category, query)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT s.story_id, s.title, s.source, s.length {where} ORDER BY s.position LIMIT ? OFFSET ?",
+                params + [page_size, max(0, page) * page_size]
+            ).fetchall()
+        return total, [{"id": sid, "title": title, "source": source, "length": length}
+                       for sid, title, source, length in rows]
+
+    def text(self, story_id):
+        """Full text of one story ("" if it is not in the catalog)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT content FROM stories WHERE story_id = ?", (story_id,)).fetchone()
+        return row[0] if row else ""
+
+_story_catalog = None
+
+def get_story_catalog():
+    """Return the shared StoryCatalog, or None if it cannot be opened."""
+    global _story_catalog
+    if _story_catalog is None:
+        with _chroma_lock:
+            if _story_catalog is None:
+                try:
+                    _story_catalog = StoryCatalog()
+                except sqlite3.Error as e:
+                    print(f"Story catalog unavailable ({str(e)}); browsing is disabled.")
+                    _story_catalog = False
+    return _story_catalog or None
+
+def sync_story_catalog(category, stories, prune=True):
+    """Record the stories behind stored chunks in the browse catalog (in story order)."""
+    catalog = get_story_catalog()
+    if catalog is None:
+        return
+    try:
+        catalog.sync(category, stories, prune)
+    except sqlite3.Error as e:
+        print(f"Story catalog update failed for {category}: {str(e)}")
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several best-first id lists into one, scoring each id by sum(1 / (k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+# In-process LRU cache of retrieval results. Every ingest bumps the category's version,
+# which changes the cache key, so results from before an ingest are never served again.
+# Clearing the whole cache bumps a global epoch that is part of every version.
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE") or 512)
+
+_collection_versions = {}
+_retrieval_epoch = 0
+_retrieval_cache = OrderedDict()
+_retrieval_stats = {"hits": 0, "misses": 0, "lexical_fallbacks": 0}
+_retrieval_lock = threading.Lock()
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, used for cache keys."""
+    return " ".join(str(query).lower().split())
+
+def collection_version(category):
+    """Current cache version of a category: (global epoch, per-category counter)."""
+    with _retrieval_lock:
+        return (_retrieval_epoch, _collection_versions.get(category, 0))
+
+def bump_collection_version(category):
+    """Invalidate cached retrieval results for a category (called after every ingest)."""
+    with _retrieval_lock:
+        _collection_versions[category] = _collection_versions.get(category, 0) + 1
+        for key in [k for k in _retrieval_cache if k[0] == category]:
+            del _retrieval_cache[key]
+
+def _retrieval_cache_get(key):
+    with _retrieval_lock:
+        docs = _retrieval_cache.get(key)
+        if docs is None:
+            _retrieval_stats["misses"] += 1
+            return None
+        _retrieval_cache.move_to_end(key)
+        _retrieval_stats["hits"] += 1
+        return docs
+
+def _retrieval_cache_set(key, entries):
+    with _retrieval_lock:
+        # Drop results computed against a version that was bumped mid-query
+        if key[3] != (_retrieval_epoch, _collection_versions.get(key[0], 0)):
+            return
+        _retrieval_cache[key] = tuple(entries)
+        _retrieval_cache.move_to_end(key)
+        while len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+            _retrieval_cache.popitem(last=False)
+
+def retrieval_cache_stats():
+    """Hits, misses, hit rate and size of the retrieval cache, plus hybrid queries that fell back to vectors."""
+    with _retrieval_lock:
+        hits = _retrieval_stats["hits"]
+        misses = _retrieval_stats["misses"]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0,
+            "size": len(_retrieval_cache),
+            "lexical_fallbacks": _retrieval_stats["lexical_fallbacks"]
+        }
+
+def clear_retrieval_cache():
+    """Drop every cached retrieval result; queries already running will not store theirs."""
+    global _retrieval_epoch
+    with _retrieval_lock:
+        _retrieval_epoch += 1
+        _retrieval_cache.clear()
+
+# Max rows sent to Chroma in a single upsert/update/delete call
+CHROMA_BATCH_SIZE = 1000
+
+def story_id(story, category="web"):
+    """Stable id for a story: hash of its source and content (independent of position)."""
+    digest = hashlib.sha1()
+    digest.update(str(story.get("source", "")).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(story["content"].encode("utf-8"))
+    return f"{category}_{digest.hexdigest()[:24]}"
+
+def _batched(items, size=CHROMA_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# Token-aware chunking: stories are stored as overlapping, sentence-aligned chunks
+# that each fit the embedding model (MiniLM reads at most 256 word pieces).
+# CHUNK_TOKENS=0 stores every story as a single chunk.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS") or 200)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS") or 40)
+CHUNK_CANDIDATES = 3    # chunks fetched per requested story before grouping by parent
+
+_TOKEN_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_BREAK_RE = re.compile(r"[.!?]+[\"'”’)\]]*(?=\s)|\n\s*\n")
+_WORD_RE = re.compile(r"\S+")
+_token_encoding = None
+
+# Bump whenever the fallback estimate in count_tokens changes: it moves chunk boundaries
+TOKEN_ESTIMATE_VERSION = 2
+
+def _get_token_encoding():
+    global _token_encoding
+    if tiktoken is not None and _token_encoding is None:
+        try:
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoding = False
+    return _token_encoding or None
 
-    ids = [f"{category}_story_{i}" for i in range(len(stories))]
-    metadatas = [
-        {
-            "index": i,
-            "source": stories[i]["source"],
+def tokenizer_id():
+    """
+    Identifies the token counter chunk boundaries come from ("cl100k_base" or "estimate-<n>").
+    It is hashed into every chunk id, so installing or removing tiktoken, or changing the
+    estimate, yields new chunk ids instead of mixing chunkings in one collection.
+    """
+    return "cl100k_base" if _get_token_encoding() else f"estimate-{TOKEN_ESTIMATE_VERSION}"
+
+def count_tokens(text):
+    """Token count of text (tiktoken cl100k_base if available, else a word/punctuation estimate)."""
+    encoding = _get_token_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # Roughly one token per word or punctuation mark, but never fewer than one per 4 characters
+    return max(len(_TOKEN_ESTIMATE_RE.findall(text)), len(text) // 4)
+
+def sentence_spans(text):
+    """(start, end) offsets of the sentences in text, split at .!? and paragraph breaks."""
+    spans = []
+    start = 0
+    for m in _SENTENCE_BREAK_RE.finditer(text):
+        end = m.end() if m.group().strip() else m.start()
+        spans.append((start, end))
+        start = m.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            trimmed.append((start, end))
+    return trimmed
+
+def _split_long_span(text, start, end, max_tokens):
+    """
+    Split one over-long sentence into word-aligned pieces of at most max_tokens (a single
+    word longer than that becomes a piece of its own).
+    """
+    pieces = []
+    piece_start = None
+    piece_end = start
+    tokens = 0
+    for m in _WORD_RE.finditer(text, start, end):
+        if piece_start is not None:
+            # Token counts are not additive, so the joined piece is measured as a whole
+            n = count_tokens(text[piece_start:m.end()])
+            if n <= max_tokens:
+                piece_end = m.end()
+                tokens = n
+                continue
+            pieces.append((piece_start, piece_end, tokens))
+        piece_start = m.start()
+        piece_end = m.end()
+        tokens = count_tokens(m.group())
+    if piece_start is not None:
+        pieces.append((piece_start, piece_end, tokens))
+    return pieces
+
+def chunk_text(text, max_tokens=None, overlap_tokens=None):
+    """
+    Split text into chunks of whole sentences of at most max_tokens tokens, each chunk
+    repeating up to overlap_tokens of trailing sentences from the previous one.
+    Returns a list of (start, end) character offsets into text.
+    """
+    max_tokens = CHUNK_TOKENS if max_tokens is None else max_tokens
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    spans = sentence_spans(text)
+    if not spans:
+        return []
+    if max_tokens <= 0:
+        return [(spans[0][0], spans[-1][1])]
+
+    units = []
+    for start, end in spans:
+        n = count_tokens(text[start:end])
+        if n > max_tokens:
+            units.extend(_split_long_span(text, start, end, max_tokens))
+        else:
+            units.append((start, end, n))
+
+    chunks = []
+    i = 0
+    while i < len(units):
+        # Grow the chunk one unit at a time, measuring the joined text: token counts of
+        # sentences do not simply add up (whitespace, the len/4 floor, BPE merges)
+        j = i + 1
+        while j < len(units) and count_tokens(text[units[i][0]:units[j][1]]) <= max_tokens:
+            j += 1
+        chunks.append((units[i][0], units[j - 1][1]))
+        if j >= len(units):
+            break
+        # Start the next chunk a few sentences back, always moving forward by at least one
+        k = j
+        overlap = 0
+        while k - 1 > i and overlap + units[k - 1][2] <= overlap_tokens:
+            k -= 1
+            overlap += units[k][2]
+        i = k
+    return chunks
+
+def chunk_story(story, category="web", index=0):
+    """
+    Chunk one story for storage. Returns [(chunk_id, document, metadata)], where metadata
+    links every chunk to its parent story (parent_id) and its position in it (start/end).
+    """
+    parent_id = story_id(story, category)
+    content = story["content"]
+    tokenizer = tokenizer_id()
+    chunks = []
+    for chunk_index, (start, end) in enumerate(chunk_text(content)):
+        document = content[start:end]
+        # The digest covers the tokenizer too: the same text chunked by another counter is a new chunk
+        digest = hashlib.sha1(f"{tokenizer}\0{document}".encode("utf-8")).hexdigest()[:8]
+        chunks.append((f"{parent_id}_{chunk_index}_{digest}", document, {
+            "index": index,
+            "source": story["source"],
             "category": category,
-            "title": stories[i].get("title", "Untitled")
-        }
-        for i in range(len(stories))
-    ]
-    documents = [story["content"] for story in stories]
+            "title": story.get("title", "Untitled"),
+            "parent_id": parent_id,
+            "chunk_index": chunk_index,
+            "tokenizer": tokenizer,
+            "start": start,
+            "end": end
+        }))
+    return chunks
+
+def chunk_parent_id(chunk_id):
+    """Parent story id of a chunk id ("<parent>_<index>_<digest>"); whole-story ids map to themselves."""
+    parts = chunk_id.rsplit("_", 2)
+    if len(parts) == 3 and parts[1].isdigit() and len(parts[2]) == 8:
+        return parts[0]
+    return chunk_id
+
+def assemble_chunks(hits, limit):
+    """
+    Group best-first chunk hits ({"id", "document", "metadata", ...}) by parent story and
+    stitch each parent's hits back together in reading order: overlaps between neighbouring
+    chunks are dropped and gaps are marked with "...". Returns at most `limit` hits, one per
+    parent, ranked by their best chunk.
+    """
+    groups = OrderedDict()
+    for hit in hits:
+        meta = hit.get("metadata") or {}
+        groups.setdefault(meta.get("parent_id") or hit["id"], []).append(hit)
+
+    assembled = []
+    for parent_id, group in list(groups.items())[:limit]:
+        ordered = sorted(group, key=lambda h: (h.get("metadata") or {}).get("start", 0))
+        parts = []
+        prev = None
+        for hit in ordered:
+            meta = hit.get("metadata") or {}
+            document = hit["document"]
+            if prev is not None and meta.get("chunk_index") == prev.get("chunk_index", -2) + 1:
+                overlap = prev["end"] - meta["start"]
+                parts[-1] += document[overlap:] if overlap > 0 else " " + document
+            elif parts and document in parts[-1]:
+                continue
+            else:
+                parts.append(document)
+            prev = meta if "start" in meta else None
+        assembled.append(dict(group[0], id=parent_id, document="\n...\n".join(parts), chunks=len(group)))
+    return assembled
 
+# Function to store stories in ChromaDB by category
+def store_in_chromadb(stories, category="web", prune=True, progress=None):
+    """
+    Incrementally sync stories into the category collection, one row per chunk (see chunk_story).
+    Only chunks whose id is not stored yet are embedded; with prune=True stored chunks
+    missing from `stories` are deleted.
+    Returns {"stories": n, "added": n, "unchanged": n, "removed": n} counting stories (a story
+    is added if any of its chunks is new), plus the same counts for chunks ("chunks_added", ...).
+    `progress` (an IngestJob) receives chunks/embedded/upserted counts and can cancel
+    between batches; whatever was upserted by then stays searchable.
+    """
+    collection = get_story_collection(category)
+
+    # Dedupe by id, keeping the first occurrence so ordering stays deterministic
+    _report(progress, "splitting", stories=len(stories))
+    entries = {}
+    parents = {}
+    for i, story in enumerate(stories):
+        for _id, document, metadata in chunk_story(story, category, i):
+            if _id in entries:
+                continue
+            parents.setdefault(metadata["parent_id"], (story, []))[1].append(_id)
+            entries[_id] = {"document": document, "metadata": metadata}
+
+    # Pruning needs every stored id; otherwise only look up the ids being stored, so adding a
+    # few stories costs the same however large the category already is
     try:
-        collection.add(documents=documents, metadatas=metadatas, ids=ids)
+        if prune:
+            existing_ids = set(collection.get(where=category_filter(category), include=[])["ids"])
+        else:
+            existing_ids = set()
+            for batch in _batched(list(entries)):
+                existing_ids.update(collection.get(ids=batch, include=[])["ids"])
     except Exception:
+        existing_ids = set()
+
+    added_ids = [_id for _id in entries if _id not in existing_ids]
+    unchanged_ids = [_id for _id in entries if _id in existing_ids]
+    removed_ids = [_id for _id in existing_ids if _id not in entries] if prune else []
+
+    _report(progress, "embedding", chunks=len(entries), embedded=0, upserted=0)
+    for batch in _batched(removed_ids):
+        collection.delete(ids=batch)
+
+    upserted = []
+    try:
+        for batch in _batched(added_ids):
+            documents = [entries[_id]["document"] for _id in batch]
+            embedding_args = _embedding_args(documents)
+            _report(progress, embedded=len(upserted) + len(batch))
+            collection.upsert(
+                ids=batch,
+                documents=documents,
+                metadatas=[entries[_id]["metadata"] for _id in batch],
+                **embedding_args
+            )
+            upserted.extend(batch)
+            _report(progress, upserted=len(upserted))
+
+        # Refresh positional metadata only; documents are untouched so nothing is re-embedded
+        for batch in _batched(unchanged_ids):
+            try:
+                collection.update(ids=batch, metadatas=[entries[_id]["metadata"] for _id in batch])
+            except Exception:
+                pass
+    finally:
+        # Runs on cancellation too, so the lexical index and retrieval cache match what was stored
+        stored = {_id: entries[_id] for _id in unchanged_ids + upserted}
+        sync_lexical_index(category, stored, prune)
+        # Browse catalog lists the stories whose chunks are all stored
+        sync_story_catalog(category, [
+            (parent_id, story.get("title", "Untitled"), story["source"], story["content"])
+            for parent_id, (story, chunk_ids) in parents.items()
+            if all(_id in stored for _id in chunk_ids)
+        ], prune)
+        bump_collection_version(category)
+
+    added_parents = {entries[_id]["metadata"]["parent_id"] for _id in added_ids}
+    removed_parents = {chunk_parent_id(_id) for _id in removed_ids} - set(parents)
+    stats = {
+        "stories": len(parents),
+        "added": len(added_parents),
+        "unchanged": len(parents) - len(added_parents),
+        "removed": len(removed_parents),
+        "chunks_added": len(added_ids),
+        "chunks_unchanged": len(unchanged_ids),
+        "chunks_removed": len(removed_ids)
+    }
+    print(f"ChromaDB [{category}]: {stats['stories']} stories in {len(entries)} chunks; "
+          f"{stats['added']} stories added, {stats['unchanged']} unchanged, {stats['removed']} removed "
+          f"({stats['chunks_added']} chunks added, {stats['chunks_removed']} removed)")
+    return stats
+
+# Function to retrieve relevant documents from ChromaDB
+# Results are cached per (category, normalized query, top_k, collection version, mode).
+# mode="hybrid" fuses BM25 and vector rankings (RETRIEVAL_MODE sets the default).
+# Matching chunks are stitched back per parent story, so each doc holds only the passages that matched.
+def retrieve_relevant_docs(query, category="web", top_k=3, use_cache=True, mode=None):
+    mode = mode or RETRIEVAL_MODE
+    key = (category, normalize_query(query), top_k, collection_version(category), mode)
+    if use_cache:
+        cached = _retrieval_cache_get(key)
+        if cached is not None:
+            return [entry["document"] for entry in cached]
+
+    collection = get_story_collection(category, create=False)
+    if collection is None:
+        return []
+
+    n_results = top_k * CHUNK_CANDIDATES
+    if mode == "hybrid":
+        n_results *= HYBRID_CANDIDATES
+    # Query and get documents with metadata
+    results = collection.query(
+        n_results=n_results,
+        where=category_filter(category),
+        include=["documents", "metadatas", "distances"],
+        **_query_args([query])
+    )
+    hits = _vector_hits(results, 0)
+
+    complete = True
+    if mode == "hybrid":
+        hits, complete = _fuse_with_lexical(query, category, collection, hits, n_results)
+
+    entries = [_doc_entry(hit, category) for hit in assemble_chunks(hits, top_k)]
+    # A vector-only fallback is not cached, so the next identical query tries BM25 again
+    if complete:
+        _retrieval_cache_set(key, entries)
+    return [entry["document"] for entry in entries]
+
+def _vector_hits(results, qi):
+    """Chunk hits of query number qi in a Chroma query() result, best first."""
+    return [
+        {"id": _id, "document": doc, "metadata": meta or {}, "distance": dist}
+        for _id, doc, meta, dist in zip(
+            results["ids"][qi], results["documents"][qi], results["metadatas"][qi], results["distances"][qi]
+        )
+        if doc
+    ]
+
+def _doc_entry(hit, category):
+    """Retrieval result for one assembled parent story (the form kept in the retrieval cache)."""
+    meta = hit.get("metadata") or {}
+    return {
+        "id": hit["id"],
+        "document": hit["document"],
+        "title": meta.get("title", "Untitled"),
+        "source": meta.get("source"),
+        "category": meta.get("category") or category,
+        "distance": hit.get("distance")
+    }
+
+def _fuse_with_lexical(query, category, collection, vector_hits, limit):
+    """
+    Combine vector hits with BM25 hits by reciprocal rank fusion. Returns (top `limit` hits,
+    False if the BM25 search failed or ran out of budget and the ranking is vector-only).
+    """
+    index = get_lexical_index()
+    lexical = []
+    complete = True
+    if index is not None:
         try:
-            for _id in ids:
-                collection.delete(ids=[_id])
+            lexical = index.search(query, category, limit=limit, budget_ms=LEXICAL_BUDGET_MS)
+        except sqlite3.Error as e:
+            # Usually the LEXICAL_BUDGET_MS abort; counted so the degraded path shows in the stats
+            with _retrieval_lock:
+                _retrieval_stats["lexical_fallbacks"] += 1
+            complete = False
+            print(f"Lexical search skipped ({str(e)}); using vector ranking only.")
+    hits = {hit["id"]: hit for hit in vector_hits}
+    for doc_id, content in lexical:
+        if content and doc_id not in hits:
+            hits[doc_id] = {"id": doc_id, "document": content, "metadata": {}}
+
+    # Lexical-only hits need their chunk metadata to be stitched with their neighbours
+    missing = [doc_id for doc_id, _content in lexical if doc_id in hits and not hits[doc_id]["metadata"]]
+    if missing:
+        try:
+            found = collection.get(ids=missing, include=["metadatas"])
+            for doc_id, meta in zip(found["ids"], found["metadatas"]):
+                hits[doc_id]["metadata"] = meta or {}
         except Exception:
             pass
-        collection.add(documents=documents, metadatas=metadatas, ids=ids)
 
-# Function to retrieve relevant documents from ChromaDB
-def retrieve_relevant_docs(query, category="web", top_k=3):
-    client = chromadb.Client()
-    collection_name = f"stories_{category}"
-    
-    try:
-        collection = client.get_collection(name=collection_name)
-    except Exception:
+    fused = reciprocal_rank_fusion([[hit["id"] for hit in vector_hits], [doc_id for doc_id, _content in lexical]])
+    return [hits[doc_id] for doc_id in fused[:limit] if doc_id in hits], complete
+
+# Batched retrieval: all queries go to Chroma in one query() call per collection (embedded together).
+# category=None searches every category and merges hits by distance (a single call in the
+# unified layout); `where` is a Chroma metadata filter such as {"source": "Moral Stories.pdf"}.
+# Returns one list per query of {"id", "document", "title", "source", "category", "distance"},
+# one entry per parent story (id is the parent id, document its stitched matching chunks).
+# A single-category search without `where` matches retrieve_relevant_docs: it uses the same
+# mode (hybrid fuses BM25 per query) and shares its cache entries. With `where` the search is
+# vector-only, as the BM25 index cannot apply metadata filters. A failed single-category
+# search raises; across categories a failing collection is reported and skipped.
+def retrieve_relevant_docs_batch(queries, category=None, top_k=3, where=None, mode=None, use_cache=True):
+    queries = list(queries)
+    if not queries:
         return []
+    mode = "vector" if where else (mode or RETRIEVAL_MODE)
 
-    # Query and get documents with metadata
-    results = collection.query(query_texts=[query], n_results=top_k)
-    docs = results.get("documents", [[]])[0]
-    # Filter out empty strings
-    docs = [d for d in docs if d]
-    return docs
+    if CHROMA_LAYOUT == "unified" or category is not None:
+        targets = [category]
+    else:
+        targets = list(load_categories().keys())
+
+    output = [None] * len(queries)
+    keys = [None] * len(queries)
+    if category is not None and where is None:
+        version = collection_version(category)
+        for qi, query in enumerate(queries):
+            keys[qi] = (category, normalize_query(query), top_k, version, mode)
+            cached = _retrieval_cache_get(keys[qi]) if use_cache else None
+            if cached is not None:
+                output[qi] = [dict(entry) for entry in cached]
+    pending = [qi for qi, entries in enumerate(output) if entries is None]
+    if not pending:
+        return output
+
+    n_results = top_k * CHUNK_CANDIDATES
+    if mode == "hybrid":
+        n_results *= HYBRID_CANDIDATES
+    rankings = [[] for _ in pending]  # per pending query: one ranked hit list per category
+    complete = [True] * len(pending)
+    query_args = None
+    for cat in targets:
+        collection = get_story_collection(cat, create=False)
+        if collection is None:
+            continue
+        try:
+            # Embed the queries once and reuse the vectors for every collection
+            if query_args is None:
+                query_args = _query_args([queries[qi] for qi in pending])
+            results = collection.query(
+                n_results=n_results,
+                where=category_filter(cat, where),
+                include=["documents", "metadatas", "distances"],
+                **query_args
+            )
+        except Exception as e:
+            if len(targets) == 1:
+                raise
+            print(f"Batch retrieval failed for {cat or 'all categories'}: {str(e)}")
+            continue
+        for n, qi in enumerate(pending):
+            hits = _vector_hits(results, n)
+            for hit in hits:
+                hit["metadata"] = dict(hit["metadata"], category=hit["metadata"].get("category") or cat)
+            if mode == "hybrid":
+                hits, ok = _fuse_with_lexical(queries[qi], cat, collection, hits, n_results)
+                complete[n] = complete[n] and ok
+            rankings[n].append(hits)
+
+    for n, qi in enumerate(pending):
+        if len(rankings[n]) == 1:
+            hits = rankings[n][0]
+        elif mode == "hybrid":
+            # Fused rankings have no common distance scale; fuse them again across categories
+            by_id = {hit["id"]: hit for ranking in rankings[n] for hit in ranking}
+            hits = [by_id[doc_id] for doc_id in reciprocal_rank_fusion(
+                [[hit["id"] for hit in ranking] for ranking in rankings[n]])]
+        else:
+            hits = sorted((hit for ranking in rankings[n] for hit in ranking), key=lambda h: h["distance"])
+        entries = [_doc_entry(hit, category) for hit in assemble_chunks(hits, top_k)]
+        if keys[qi] is not None and complete[n]:
+            _retrieval_cache_set(keys[qi], [dict(entry) for entry in entries])
+        output[qi] = entries
+    return output
+
+# Rows copied per page when migrating collections
+MIGRATION_PAGE_SIZE = 500
+
+def migrate_to_unified_layout(categories=None, delete_old=False):
+    """
+    Copy stories_<category> collections into the unified collection, reusing the stored
+    embeddings (nothing is re-embedded). Returns {category: rows copied}.
+    Set CHROMA_LAYOUT=unified afterwards; pass delete_old=True to drop the old collections.
+    """
+    client = get_chroma_client()
+    target = client.get_or_create_collection(name=UNIFIED_COLLECTION, metadata={"embedder": embedding_space()})
+    copied = {}
+    for category in (categories or list(load_categories().keys())):
+        name = collection_name_for(category, layout="per_category")
+        try:
+            source = client.get_collection(name=name)
+        except Exception:
+            continue
+        if collection_embedding_space(source) != collection_embedding_space(target):
+            print(f"Skipping {name}: its {collection_embedding_space(source)} embeddings do not match "
+                  f"{collection_embedding_space(target)} in {UNIFIED_COLLECTION}")
+            continue
+        count = 0
+        offset = 0
+        while True:
+            page = source.get(
+                limit=MIGRATION_PAGE_SIZE, offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            ids = page["ids"]
+            if not ids:
+                break
+            metadatas = [dict(m or {}, category=category) for m in page["metadatas"]]
+            target.upsert(
+                ids=ids,
+                documents=page["documents"],
+                metadatas=metadatas,
+                embeddings=page["embeddings"]
+            )
+            count += len(ids)
+            offset += len(ids)
+        copied[category] = count
+        print(f"Migrated {count} stories from {name} to {UNIFIED_COLLECTION}")
+        if delete_old:
+            client.delete_collection(name=name)
+
+    reset_collection_cache()
+    return copied
+
+# Background ingestion: loads run as jobs on a bounded thread pool so the UI never waits
+# on them. Jobs live in an in-process registry; each one records its stage and counters
+# (files parsed, stories split, chunks embedded and upserted) and can be cancelled.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS") or 2)
+INGEST_HISTORY = 50  # finished jobs kept in the registry
+
+class IngestJob:
+    """One ingestion run for a category; read it through snapshot() from other threads."""
+
+    def __init__(self, category, kind="load", paths=None):
+        self.id = hashlib.sha1(f"{category}\0{kind}\0{time.time()}\0{id(self)}".encode("utf-8")).hexdigest()[:12]
+        self.category = category
+        self.kind = kind
+        self.paths = list(paths) if paths else None
+        self.status = "queued"      # queued, running, done, failed, cancelled
+        self.stage = "queued"
+        self.counts = {}
+        self.result = None          # {"stories": [...], "stats": {...} or None} when done
+        self.error = None
+        self.stale = False          # set once newer admin changes make the result outdated
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None          # set when the job gets its turn on the pool
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, **counts):
+        """Record progress; raises IngestCancelled if the job was cancelled."""
+        with self._lock:
+            if stage:
+                self.stage = stage
+            self.counts.update(counts)
+        if self._cancel.is_set():
+            raise IngestCancelled()
+
+    def cancel(self):
+        """Ask the job to stop; a queued job never starts, a running one stops at its next report."""
+        self._cancel.set()
+        with self._lock:
+            if self.status == "queued":
+                self._set_finished("cancelled")
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns done()."""
+        self._done.wait(timeout)
+        return self.done()
+
+    def _start(self):
+        """Mark the job running; False if it was cancelled while waiting for its turn."""
+        with self._lock:
+            if self.status != "queued":
+                return False
+            self.status = "running"
+            self.started = time.time()
+            return True
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self._set_finished(status, result, error)
+
+    def _set_finished(self, status, result=None, error=None):
+        self.status = status
+        self.stage = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self._done.set()
+
+    def snapshot(self):
+        """Plain-dict copy of the job state for display."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "category": self.category,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "counts": dict(self.counts),
+                "error": self.error,
+                "elapsed": ((self.finished or time.time()) - self.started) if self.started else 0.0,
+            }
+
+_ingest_jobs = OrderedDict()
+_ingest_lock = threading.Lock()
+_ingest_executor = None
+# One ingest per category at a time (concurrent syncs of one collection would race). Jobs
+# wait in a per-category FIFO and the next one is handed to the pool only when the previous
+# one finishes, so pool threads never sit blocked while other categories have work.
+_category_queues = {}
+_busy_categories = set()
+
+def _dispatch_next(category):
+    """Submit the category's next waiting job to the pool. Call with _ingest_lock held."""
+    waiting = _category_queues.get(category)
+    while waiting:
+        job = waiting.popleft()
+        if not job.done():  # skip jobs cancelled while they waited
+            job.future = _ingest_executor.submit(_run_ingest_job, job)
+            return
+    _category_queues.pop(category, None)
+    _busy_categories.discard(category)
+
+def _run_ingest_job(job):
+    try:
+        if job._start():
+            _ingest(job)
+    finally:
+        with _ingest_lock:
+            _dispatch_next(job.category)
+
+# The ingestion itself: load (only the given files for uploads), then sync into Chroma
+def _ingest(job):
+    try:
+        job.update("starting")
+        if job.paths:
+            # Only the given files: nothing else in the category is re-read or pruned
+            stories = load_stories_from_pdf_paths(job.paths, progress=job)
+            stats = store_in_chromadb(stories, job.category, prune=False, progress=job) if stories else None
+        else:
+            if job.category == "web":
+                stories = scrape_stories(progress=job)
+            else:
+                stories = load_stories_from_pdfs(job.category, progress=job)
+                # Pick up PDFs added outside the uploader so later uploads can detect duplicates
+                index_category_pdfs(job.category, progress=job)
+            stats = store_in_chromadb(stories, job.category, progress=job) if stories else None
+        job._finish("done", {"stories": stories, "stats": stats})
+    except IngestCancelled:
+        job._finish("cancelled")
+    except Exception as e:
+        print(f"Ingest job {job.id} ({job.category}) failed: {str(e)}")
+        job._finish("failed", error=str(e))
+
+def submit_ingest_job(category, kind="load", paths=None, reuse=True):
+    """
+    Queue an ingestion job and return it at once. With reuse=True an equivalent job that
+    is still running, or that found stories since the last invalidate_ingest_results(),
+    is returned instead of starting another one.
+    """
+    global _ingest_executor
+    key = (category, kind, tuple(paths) if paths else None)
+    with _ingest_lock:
+        if reuse:
+            for job in reversed(_ingest_jobs.values()):
+                if (job.category, job.kind, tuple(job.paths) if job.paths else None) != key:
+                    continue
+                if not job.done():
+                    return job
+                # Reuse a finished load only if it found something
+                if job.status == "done" and not job.stale and job.result["stories"]:
+                    return job
+        if _ingest_executor is None:
+            _ingest_executor = ThreadPoolExecutor(max_workers=max(1, INGEST_WORKERS), thread_name_prefix="ingest")
+        job = IngestJob(category, kind, paths)
+        _ingest_jobs[job.id] = job
+        _category_queues.setdefault(category, deque()).append(job)
+        if category not in _busy_categories:
+            _busy_categories.add(category)
+            _dispatch_next(category)
+
+        finished = [j.id for j in _ingest_jobs.values() if j.done()]
+        for job_id in finished[:max(0, len(finished) - INGEST_HISTORY)]:
+            del _ingest_jobs[job_id]
+    return job
+
+def get_ingest_job(job_id):
+    with _ingest_lock:
+        return _ingest_jobs.get(job_id)
+
+def list_ingest_jobs(category=None):
+    """Jobs in submission order, optionally for one category."""
+    with _ingest_lock:
+        return [job for job in _ingest_jobs.values() if category is None or job.category == category]
+
+def invalidate_ingest_results(category=None):
+    """Mark finished jobs as outdated so the next submit_ingest_job runs a fresh ingest."""
+    with _ingest_lock:
+        for job in _ingest_jobs.values():
+            if category is None or job.category == category:
+                job.stale = True
 
 # Helper to locate OpenAI API key from env or file
 def get_openai_key():
@@ -413,6 +2546,133 @@ def get_openai_key():
 
     return None
 
+_openai_client = None
+_openai_client_key = None
+_openai_lock = threading.Lock()
+
+def get_openai_client(api_key=None):
+    """
+    Shared OpenAI client for the current key, created once per process (its HTTP
+    connection pool is reused across requests). Returns None without a key or package;
+    SDKs without an OpenAI class get the module itself.
+    """
+    global _openai_client, _openai_client_key
+    api_key = api_key or get_openai_key()
+    if openai is None or not api_key:
+        return None
+    if not hasattr(openai, "OpenAI"):
+        openai.api_key = api_key
+        return openai
+    with _openai_lock:
+        if _openai_client is None or _openai_client_key != api_key:
+            _openai_client = openai.OpenAI(api_key=api_key)
+            _openai_client_key = api_key
+    return _openai_client
+
+# Context packing: retrieved documents are deduplicated, trimmed to their most relevant
+# sentences and fitted into a per-model token budget before they go into a prompt.
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 2500,
+    "gpt-3.5-turbo": 1500,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET") or 0)  # overrides the table when set
+NEAR_DUPLICATE_THRESHOLD = 0.8  # word 3-gram Jaccard similarity above which a passage is dropped
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has he her his in is it its of on or she that the "
+    "their them they this to was were will with about story stories".split()
+)
+
+def context_budget_for(model):
+    """Token budget for retrieved context in prompts sent to `model`."""
+    if CONTEXT_TOKEN_BUDGET > 0:
+        return CONTEXT_TOKEN_BUDGET
+    return CONTEXT_TOKEN_BUDGETS.get(model, DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+def _shingles(text, size=3):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _query_terms(query):
+    return {w for w in re.findall(r"\w+", str(query).lower()) if w not in _STOPWORDS and len(w) > 1}
+
+def _trim_to_budget(doc, terms, budget):
+    """Keep the sentences of doc sharing the most words with terms, in reading order, within budget tokens."""
+    spans = sentence_spans(doc)
+    scored = []
+    for position, (start, end) in enumerate(spans):
+        sentence = doc[start:end]
+        words = set(re.findall(r"\w+", sentence.lower()))
+        scored.append((-len(words & terms), position, sentence, count_tokens(sentence)))
+
+    kept = []
+    used = 0
+    for _score, position, sentence, tokens in sorted(scored):
+        if used + tokens <= budget:
+            kept.append((position, sentence))
+            used += tokens
+    if not kept and scored and budget > 0:
+        # Not even one sentence fits: keep the leading words of the best one
+        sentence = min(scored)[2]
+        start, end, tokens = _split_long_span(sentence, 0, len(sentence), budget)[0]
+        text = sentence[start:end]
+        if tokens > budget:  # a single huge "word" (e.g. an unbroken URL)
+            text = text[:budget * 4]
+        return text, count_tokens(text)
+    kept.sort()
+    return " ".join(sentence for _position, sentence in kept), used
+
+def pack_context(context_docs, query="", budget=None, model=None):
+    """
+    Fit best-first context_docs into a token budget for one prompt.
+    Near-duplicates of earlier passages are dropped; a document larger than its share of the
+    remaining budget keeps only its sentences most relevant to `query`.
+    Returns (packed_docs, info) with info = {"docs_in", "docs_out", "duplicates",
+    "tokens_in", "tokens_out", "budget"}.
+    """
+    budget = context_budget_for(model or STORY_MODEL) if budget is None else budget
+    docs = [d for d in (context_docs or []) if d and d.strip()]
+    info = {"docs_in": len(docs), "docs_out": 0, "duplicates": 0, "budget": budget,
+            "tokens_in": sum(count_tokens(d) for d in docs), "tokens_out": 0}
+
+    unique = []
+    seen = []
+    for doc in docs:
+        shingles = _shingles(doc)
+        if any(len(shingles & other) / float(len(shingles | other)) >= NEAR_DUPLICATE_THRESHOLD for other in seen):
+            info["duplicates"] += 1
+            continue
+        seen.append(shingles)
+        unique.append(doc)
+
+    terms = _query_terms(query)
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    packed = []
+    remaining = budget
+    for i, doc in enumerate(unique):
+        if packed:
+            remaining -= separator_tokens
+        # Fair share of what is left; short documents leave more room for the ones after them
+        share = remaining // (len(unique) - i)
+        tokens = count_tokens(doc)
+        if tokens > share:
+            doc, tokens = _trim_to_budget(doc, terms, share)
+        if not doc:
+            continue
+        packed.append(doc)
+        remaining -= tokens
+    info["docs_out"] = len(packed)
+    info["tokens_out"] = count_tokens(CONTEXT_SEPARATOR.join(packed)) if packed else 0
+    return packed, info
+
+def count_message_tokens(messages):
+    """Estimated prompt tokens of a chat request (content plus per-message overhead)."""
+    return sum(count_tokens(m["content"]) + 4 for m in messages) + 3
+
 # Function to perform simple RAG using OpenAI (if available)
 def generate_with_rag(query, context_docs):
     # Use helper to find key (checks multiple env names and fallback file)
@@ -433,7 +2693,8 @@ def generate_with_rag(query, context_docs):
 
     # normal flow: use OpenAI
     openai.api_key = openai_key
-    context = "\n\n---\n\n".join(context_docs) if context_docs else ""
+    packed_docs, info = pack_context(context_docs, query, model="gpt-3.5-turbo")
+    context = CONTEXT_SEPARATOR.join(packed_docs)
 
     system_msg = (
         "You are a helpful assistant that must write a story using ONLY the information "
@@ -458,6 +2719,9 @@ def generate_with_rag(query, context_docs):
             max_tokens=400,
             temperature=0.3,
         )
+        usage = resp.get("usage") or {}
+        print(f"Prompt tokens sent: {usage.get('prompt_tokens', '?')} "
+              f"(context {info['tokens_out']}/{info['tokens_in']} tokens after packing)")
         text = resp["choices"][0]["message"]["content"].strip()
         return text
     except Exception as e:
@@ -469,24 +2733,155 @@ def generate_with_rag(query, context_docs):
             fallback = "Failed to contact OpenAI: " + str(e) + "\n\nNo documents."
         return fallback
 
-# Enhanced RAG function with preferences and category
-def generate_with_rag_enhanced(preferences, context_docs, category="web"):
-    openai_key = get_openai_key()
-    if openai is None and openai_key:
-        return ("OpenAI python package not installed in this environment. "
-                "Install it with `pip install openai` to enable AI generation. "
-                "Falling back to the most relevant retrieved story.\n\n" +
-                (context_docs[0] if context_docs else "No relevant stories found in the local DB."))
+# Model settings for generate_with_rag_enhanced
+STORY_MODEL = "gpt-4o-mini"
+STORY_MAX_TOKENS = 600
+STORY_TEMPERATURE = 0.3
+
+# LLM response cache: "disk" (shared SQLite file), "memory" (per process) or "none"
+LLM_CACHE_BACKEND = (os.getenv("LLM_CACHE_BACKEND") or "disk").lower()
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES") or 1000)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL") or 7 * 24 * 3600)  # seconds
+
+def response_cache_key(model, system_msg, user_msg, temperature, context_docs):
+    """Hash of everything that determines a completion."""
+    context_hash = hashlib.sha256("\x1e".join(context_docs or []).encode("utf-8")).hexdigest()
+    payload = json.dumps([model, system_msg, user_msg, temperature, context_hash], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryResponseCache:
+    """In-process LRU cache with a TTL. Any object with get/set/stats can replace it."""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.time() - item[1] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+class DiskResponseCache:
+    """SQLite-backed LRU + TTL cache shared by every process pointing at the same file."""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def get(self, key):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            print(f"Could not write LLM response cache: {str(e)}")
+
+    def stats(self):
+        try:
+            with self._connect() as conn:
+                size = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            size = 0
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+_response_cache = None
+
+def get_response_cache():
+    """Return the configured response cache (None when LLM_CACHE_BACKEND=none)."""
+    global _response_cache
+    if _response_cache is None and LLM_CACHE_BACKEND != "none":
+        try:
+            if LLM_CACHE_BACKEND == "memory":
+                _response_cache = MemoryResponseCache()
+            else:
+                _response_cache = DiskResponseCache()
+        except Exception as e:
+            print(f"LLM response cache unavailable, using in-memory cache: {str(e)}")
+            _response_cache = MemoryResponseCache()
+    return _response_cache
 
-    if openai is None or not openai_key:
-        if not context_docs:
-            return "No relevant stories found in the local DB."
-        # Return only the most relevant retrieved document as fallback
-        primary = context_docs[0]
-        return f"Note: OpenAI key not available — returning the most relevant retrieved story for {CATEGORIES.get(category,'stories')}:\n\n{primary}"
+def set_response_cache(cache):
+    """Plug in a different cache (any object with get/set/stats), or None to disable caching."""
+    global _response_cache
+    _response_cache = cache
 
-    openai.api_key = openai_key
-    context = "\n\n---\n\n".join(context_docs) if context_docs else ""
+def response_cache_stats():
+    """Hit/miss counters and size of the response cache."""
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {"hits": 0, "misses": 0, "size": 0}
+
+# Build the (system, user) messages for generate_with_rag_enhanced / stream_with_rag_enhanced
+# context_docs are expected to be packed already (see pack_context)
+def build_enhanced_messages(preferences, context_docs, category="web"):
+    context = CONTEXT_SEPARATOR.join(context_docs) if context_docs else ""
 
     system_msg = (
         f"You are a helpful assistant that writes engaging, kid-friendly {CATEGORIES.get(category, 'stories')}. "
@@ -499,33 +2894,125 @@ def generate_with_rag_enhanced(preferences, context_docs, category="web"):
         f"Length: {preferences['length']}\n"
         f"Include a short note about which source fragments inspired this story."
     )
+    return system_msg, user_msg
+
+# Streaming variant of generate_with_rag_enhanced: yields text pieces as the model produces them.
+# Fallbacks (no key, no package, API errors) are yielded as text too, so callers just print/render.
+# If `metrics` is a dict it receives "ttft" (seconds to first piece), "total", "cached",
+# "prompt_tokens" (as reported by the API, else estimated) and "context" (pack_context info).
+# When the text is a fallback rather than a generated story, metrics["fallback"] holds why.
+def stream_with_rag_enhanced(preferences, context_docs, category="web", use_cache=True, metrics=None):
+    start = time.perf_counter()
+    if metrics is None:
+        metrics = {}
+    metrics["cached"] = False
+
+    def first_piece():
+        if "ttft" not in metrics:
+            metrics["ttft"] = time.perf_counter() - start
 
+    openai_key = get_openai_key()
+    if openai is None and openai_key:
+        first_piece()
+        metrics["fallback"] = "openai package not installed"
+        yield ("OpenAI python package not installed in this environment. "
+               "Install it with `pip install openai` to enable AI generation. "
+               "Falling back to the most relevant retrieved story.\n\n" +
+               (context_docs[0] if context_docs else "No relevant stories found in the local DB."))
+        metrics["total"] = time.perf_counter() - start
+        return
+
+    if openai is None or not openai_key:
+        first_piece()
+        metrics["fallback"] = "OpenAI key not available"
+        if not context_docs:
+            yield "No relevant stories found in the local DB."
+        else:
+            # Return only the most relevant retrieved document as fallback
+            primary = context_docs[0]
+            yield f"Note: OpenAI key not available — returning the most relevant retrieved story for {CATEGORIES.get(category,'stories')}:\n\n{primary}"
+        metrics["total"] = time.perf_counter() - start
+        return
+
+    client = get_openai_client(openai_key)
+    packed_docs, metrics["context"] = pack_context(context_docs, preferences.get("topic", ""), model=STORY_MODEL)
+    system_msg, user_msg = build_enhanced_messages(preferences, packed_docs, category)
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_msg},
+    ]
+    metrics["prompt_tokens"] = count_message_tokens(messages)
+
+    cache = get_response_cache()
+    cache_key = response_cache_key(STORY_MODEL, system_msg, user_msg, STORY_TEMPERATURE, packed_docs)
+    if cache is not None and use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            metrics["cached"] = True
+            metrics["prompt_tokens"] = 0  # nothing was sent
+            first_piece()
+            yield cached
+            metrics["total"] = time.perf_counter() - start
+            return
+
+    pieces = []
     try:
-        resp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-            max_tokens=600,
-            temperature=0.3,
+        request = dict(
+            model=STORY_MODEL,
+            messages=messages,
+            max_tokens=STORY_MAX_TOKENS,
+            temperature=STORY_TEMPERATURE,
+            stream=True,
         )
-        text = resp.choices[0].message.content.strip()
-        return text
+        try:
+            stream = client.chat.completions.create(stream_options={"include_usage": True}, **request)
+        except TypeError:
+            # SDKs older than stream_options: no usage chunk, prompt_tokens stays the estimate
+            stream = client.chat.completions.create(**request)
+        for chunk in stream:
+            # The final chunk carries token usage and no choices
+            usage = getattr(chunk, "usage", None)
+            if usage is not None and getattr(usage, "prompt_tokens", None):
+                metrics["prompt_tokens"] = usage.prompt_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            # Drop leading whitespace so streamed text matches the stripped non-streaming result
+            if not pieces:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+                first_piece()
+            pieces.append(delta)
+            yield delta
+        text = "".join(pieces).strip()
+        if cache is not None and text:
+            cache.set(cache_key, text)
     except Exception as e:
+        first_piece()
+        metrics["fallback"] = "Failed to contact OpenAI: " + str(e)
         if context_docs:
             primary = context_docs[0]
             fallback = "Failed to contact OpenAI: " + str(e) + "\n\nReturning the most relevant retrieved story:\n\n" + primary
         else:
             fallback = "Failed to contact OpenAI: " + str(e) + "\n\nNo documents."
-        return fallback
-
-# Function to convert text to speech
-def text_to_speech(text):
-    engine = pyttsx3.init()
+        yield ("\n\n" + fallback) if pieces else fallback
+    metrics["total"] = time.perf_counter() - start
+
+# Enhanced RAG function with preferences and category.
+# use_cache=False skips the cache lookup (e.g. "Regenerate" wants a fresh sample);
+# the fresh completion still replaces the cached one.
+def generate_with_rag_enhanced(preferences, context_docs, category="web", use_cache=True, metrics=None):
+    return "".join(stream_with_rag_enhanced(preferences, context_docs, category, use_cache, metrics)).strip()
+
+# Voice registry: choose the story voice once per engine (Indian accent preferred).
+# Returns (voice id or None, speaking rate or None).
+def resolve_tts_voice(engine):
+    selected_voice = None
     try:
         voices = engine.getProperty('voices') or []
-        selected_voice = None
 
         # Prefer voices that look like Indian-accent voices
         indian_keys = ("indian", "india", "aditi", "neena", "hindi", "en_in", "en-in", "en_in.utf8")
@@ -557,23 +3044,426 @@ def text_to_speech(text):
             selected_voice = voices[1]
         if not selected_voice and voices:
             selected_voice = voices[0]
+    except Exception:
+        # proceed with default voice on any error
+        pass
+
+    # Slightly adjust rate for clarity (keep near-default)
+    try:
+        rate = int(engine.getProperty('rate') * 0.98)
+    except Exception:
+        rate = None
+    return (selected_voice.id if selected_voice else None), rate
+
+# Function to convert text to speech (spoken by the shared TTS worker process)
+def text_to_speech(text):
+    get_tts_worker().say(text).result()
+
+# Content-addressed cache of synthesized story audio: one file per (text, voice, rate),
+# written under a unique temporary name and renamed into place, so concurrent sessions
+# never overwrite each other's output. Least recently played files are evicted first.
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "audio")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES") or 200 * 1024 * 1024)
+# pyttsx3 writes WAV with espeak (Linux) and SAPI5 (Windows) but AIFF with nsss (macOS)
+TTS_AUDIO_EXT = ".aiff" if sys.platform == "darwin" else ".wav"
+TTS_AUDIO_FORMAT = "audio/aiff" if TTS_AUDIO_EXT == ".aiff" else "audio/wav"
+
+_tts_cache_lock = threading.Lock()
+
+def audio_cache_key(text, voice_id=None, rate=None):
+    """Hash of everything that changes the synthesized audio."""
+    payload = json.dumps([text, voice_id, rate], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def audio_cache_path(key):
+    return os.path.join(TTS_CACHE_DIR, key + TTS_AUDIO_EXT)
+
+def load_cached_audio(key):
+    """Path of the cached audio for key (marked as recently used), or None."""
+    path = audio_cache_path(key)
+    try:
+        if os.path.getsize(path) > 0:
+            os.utime(path, None)
+            return path
+    except OSError:
+        pass
+    return None
 
-        if selected_voice:
-            engine.setProperty('voice', selected_voice.id)
+def synthesize_to_file(text, path, voice_id=None, rate=None, engine=None):
+    """Render text to an audio file with pyttsx3 (blocking; pass `engine` to reuse one)."""
+    engine = engine or pyttsx3.init()
+    try:
+        if voice_id:
+            engine.setProperty('voice', voice_id)
+        if rate:
+            engine.setProperty('rate', rate)
+    except Exception:
+        pass
+    engine.save_to_file(text, path)
+    engine.runAndWait()
 
-        # Slightly adjust rate for clarity (keep near-default)
+def synthesize_audio_file(text, voice_id=None, rate=None, use_cache=True, engine=None):
+    """
+    Return the path of an audio file for text, synthesizing it only on a cache miss.
+    use_cache=False re-synthesizes and replaces the cached file. Runs in the calling
+    process; the app goes through the TTS workers instead (synthesize_story_audio).
+    """
+    key = audio_cache_key(text, voice_id, rate)
+    if use_cache:
+        cached = load_cached_audio(key)
+        if cached:
+            return cached
+
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    path = audio_cache_path(key)
+    tmp_path = f"{path[:-len(TTS_AUDIO_EXT)]}.{os.getpid()}.{threading.get_ident()}.tmp{TTS_AUDIO_EXT}"
+    try:
+        synthesize_to_file(text, tmp_path, voice_id, rate, engine)
+        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            raise RuntimeError("speech engine produced no audio")
+        os.replace(tmp_path, path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    evict_audio_cache(keep=path)
+    return path
+
+def evict_audio_cache(max_bytes=None, keep=None):
+    """Delete least recently used audio files until the cache fits in max_bytes."""
+    if max_bytes is None:
+        max_bytes = TTS_CACHE_MAX_BYTES
+    with _tts_cache_lock:
         try:
-            rate = engine.getProperty('rate')
-            engine.setProperty('rate', int(rate * 0.98))
+            names = os.listdir(TTS_CACHE_DIR)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            # Skip in-progress temporary files of other writers (files with another
+            # extension, e.g. from older versions, are evicted like any other entry)
+            if ".tmp" in name:
+                continue
+            path = os.path.join(TTS_CACHE_DIR, name)
+            try:
+                size = os.path.getsize(path)
+                entries.append((os.path.getmtime(path), size, path))
+                total += size
+            except OSError:
+                continue
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+# Dedicated TTS worker: one long-lived process owns the pyttsx3 engine, resolves the voice
+# once at startup and runs queued jobs one at a time (pyttsx3 is not thread-safe).
+# Callers get concurrent.futures.Future objects and never block on synthesis themselves.
+TTS_START_TIMEOUT = 60  # seconds to wait for the worker to come up
+
+def _tts_worker_main(jobs, results):
+    try:
+        engine = pyttsx3.init()
+        voice_id, rate = resolve_tts_voice(engine)
+    except Exception as e:
+        results.put(("ready", None, f"Text-to-speech unavailable: {str(e)}"))
+        return
+    results.put(("ready", {"voice_id": voice_id, "rate": rate}, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, kind, text, use_cache = job
+        try:
+            if kind == "audio":
+                value = synthesize_audio_file(text, voice_id, rate, use_cache=use_cache, engine=engine)
+            else:
+                if voice_id:
+                    engine.setProperty('voice', voice_id)
+                if rate:
+                    engine.setProperty('rate', rate)
+                engine.say(text)
+                engine.runAndWait()
+                value = None
+            results.put((job_id, value, None))
+        except Exception as e:
+            results.put((job_id, None, str(e)))
+
+class TTSWorker:
+    """Handle on the TTS worker process; started lazily and restarted if it dies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+        self._jobs = None
+        self._pending = {}
+        self._next_id = 0
+        self._ready = threading.Event()
+        self.voice = None   # {"voice_id", "rate"} once the worker is up
+        self.error = None   # startup error message, if the engine could not be created
+
+    def _ensure_started(self):
+        # Called with self._lock held
+        if self._process is not None and self._process.is_alive():
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._jobs = ctx.Queue()
+        results = ctx.Queue()
+        self._pending = {}
+        self._ready = threading.Event()
+        self.voice = self.error = None
+        self._process = ctx.Process(target=_tts_worker_main, args=(self._jobs, results), daemon=True)
+        self._process.start()
+        threading.Thread(
+            target=self._collect, args=(self._process, results, self._pending, self._ready), daemon=True
+        ).start()
+
+    def _collect(self, process, results, pending, ready):
+        """Resolve futures from worker results until the worker exits."""
+        while True:
+            try:
+                job_id, value, error = results.get(timeout=1)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                break
+            except (EOFError, OSError):
+                break
+            if job_id == "ready":
+                if process is self._process:
+                    self.voice, self.error = value, error
+                ready.set()
+                continue
+            with self._lock:
+                future = pending.pop(job_id, None)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(value)
+
+        if process is self._process and self.voice is None:
+            self.error = self.error or "TTS worker exited during startup"
+        ready.set()
+        with self._lock:
+            leftovers = list(pending.values())
+            pending.clear()
+        for future in leftovers:
+            future.set_exception(RuntimeError(self.error or "TTS worker exited"))
+
+    def _submit(self, kind, text, use_cache=True):
+        future = Future()
+        with self._lock:
+            self._ensure_started()
+            self._next_id += 1
+            self._pending[self._next_id] = future
+            self._jobs.put((self._next_id, kind, text, use_cache))
+        return future
+
+    def voice_settings(self, timeout=TTS_START_TIMEOUT):
+        """(voice id, rate) resolved by the worker; starts it and waits for it if needed."""
+        with self._lock:
+            self._ensure_started()
+            ready = self._ready
+        if not ready.wait(timeout):
+            raise RuntimeError("TTS worker did not start in time")
+        voice = self.voice
+        if self.error or voice is None:
+            raise RuntimeError(self.error or "TTS worker is not available")
+        return voice["voice_id"], voice["rate"]
+
+    def synthesize(self, text, use_cache=True):
+        """Future resolving to the path of the (cached) audio file for text."""
+        return self._submit("audio", text, use_cache)
+
+    def say(self, text):
+        """Future resolving once text has been spoken aloud."""
+        return self._submit("say", text)
+
+    def shutdown(self, timeout=5):
+        with self._lock:
+            process, jobs = self._process, self._jobs
+            self._process = None
+        if process is None:
+            return
+        try:
+            jobs.put(None)
+            process.join(timeout)
         except Exception:
             pass
+        if process.is_alive():
+            process.terminate()
 
-    except Exception:
-        # proceed with default voice on any error
-        pass
+# Speech worker processes used for chunked synthesis (each owns its own engine)
+TTS_WORKERS = int(os.getenv("TTS_WORKERS") or 2)
 
-    engine.say(text)
-    engine.runAndWait()
+_tts_workers = []
+_tts_worker_lock = threading.Lock()
+
+def get_tts_workers():
+    """Return the process-wide pool of TTS_WORKERS TTSWorkers (processes start on first use)."""
+    with _tts_worker_lock:
+        while len(_tts_workers) < max(1, TTS_WORKERS):
+            worker = TTSWorker()
+            atexit.register(worker.shutdown)
+            _tts_workers.append(worker)
+        return list(_tts_workers)
+
+def get_tts_worker():
+    """Return the first TTSWorker of the pool (used for single-shot jobs)."""
+    return get_tts_workers()[0]
+
+def synthesize_audio_async(text, use_cache=True):
+    """
+    Future resolving to the audio file path for text. Cache hits are answered here without
+    a round trip once the worker's voice is known; everything else is queued to the worker.
+    """
+    worker = get_tts_worker()
+    if use_cache and worker.voice:
+        cached = load_cached_audio(audio_cache_key(text, worker.voice["voice_id"], worker.voice["rate"]))
+        if cached:
+            future = Future()
+            future.set_result(cached)
+            return future
+    return worker.synthesize(text, use_cache)
+
+# Chunked synthesis: a story is split into sentence groups that are synthesized in
+# parallel across the worker pool and stitched into one file. The first group is kept
+# short so it can be played while the rest are still being synthesized.
+TTS_FIRST_CHUNK_CHARS = 160
+TTS_CHUNK_CHARS = 600
+TTS_JOB_TIMEOUT = 600  # seconds to wait for any single chunk
+
+def split_for_speech(text, first_chars=TTS_FIRST_CHUNK_CHARS, chunk_chars=TTS_CHUNK_CHARS):
+    """Group the sentences of text into chunks of about chunk_chars (first_chars for the first)."""
+    chunks = []
+    current = []
+    size = 0
+    for start, end in sentence_spans(text):
+        sentence = text[start:end]
+        limit = chunk_chars if chunks else first_chars
+        if current and size + len(sentence) > limit:
+            chunks.append(" ".join(current))
+            current = []
+            size = 0
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def is_wav_file(path):
+    """True if path starts with a RIFF/WAVE header."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+def stitch_wav_files(paths, out_path):
+    """Concatenate WAV files with identical formats into out_path (written atomically)."""
+    for path in paths:
+        if not is_wav_file(path):
+            raise ValueError(f"{os.path.basename(path)} is not a WAV file")
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with wave.open(tmp_path, "wb") as out:
+            params = None
+            for path in paths:
+                with wave.open(path, "rb") as part:
+                    if params is None:
+                        params = part.getparams()
+                        out.setparams(params)
+                    elif part.getparams()[:3] != params[:3]:
+                        raise ValueError("audio chunks have different formats")
+                    out.writeframes(part.readframes(part.getnframes()))
+        os.replace(tmp_path, out_path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+class StoryAudioJob:
+    """
+    Chunked synthesis of one story. `first_chunk` and `result` are Futures of audio file
+    paths (the first chunk alone, then the whole story); `metrics` receives "chunks",
+    "ttfa" (seconds to first playable audio) and "total".
+    """
+
+    def __init__(self):
+        self.first_chunk = Future()
+        self.result = Future()
+        self.metrics = {}
+
+    def done(self):
+        return self.result.done()
+
+def _run_story_audio_job(job, text, use_cache):
+    start = time.perf_counter()
+
+    def finish(path, first=None):
+        if not job.first_chunk.done():
+            job.metrics["ttfa"] = time.perf_counter() - start
+            job.first_chunk.set_result(first or path)
+        job.metrics["total"] = time.perf_counter() - start
+        job.result.set_result(path)
+
+    try:
+        workers = get_tts_workers()
+        voice_id, rate = workers[0].voice_settings()
+        key = audio_cache_key(text, voice_id, rate)
+        cached = load_cached_audio(key) if use_cache else None
+        chunks = [] if cached else split_for_speech(text)
+        job.metrics["chunks"] = len(chunks)
+        if cached:
+            finish(cached)
+            return
+        # Only WAV output can be stitched, so other engines synthesize the story in one piece
+        if len(chunks) <= 1 or TTS_AUDIO_EXT != ".wav":
+            finish(workers[0].synthesize(text, use_cache).result(TTS_JOB_TIMEOUT))
+            return
+
+        futures = [workers[i % len(workers)].synthesize(chunk, use_cache) for i, chunk in enumerate(chunks)]
+        first = futures[0].result(TTS_JOB_TIMEOUT)
+        job.metrics["ttfa"] = time.perf_counter() - start
+        job.first_chunk.set_result(first)
+        paths = [future.result(TTS_JOB_TIMEOUT) for future in futures]
+
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        path = audio_cache_path(key)
+        try:
+            stitch_wav_files(paths, path)
+            evict_audio_cache(keep=path)
+        except (wave.Error, EOFError, ValueError) as e:
+            # Engine output is not stitchable WAV after all: fall back to one shot
+            print(f"Cannot stitch audio chunks ({str(e)}); synthesizing the story in one piece.")
+            path = workers[0].synthesize(text, use_cache=False).result(TTS_JOB_TIMEOUT)
+        # Chunk files stay in the shared cache (another job may be reading them);
+        # evict_audio_cache reclaims them least recently used first
+        finish(path, first)
+    except Exception as e:
+        for future in (job.first_chunk, job.result):
+            if not future.done():
+                future.set_exception(e)
+
+def synthesize_story_audio(text, use_cache=True):
+    """Start chunked, parallel synthesis of a story in the background; returns a StoryAudioJob."""
+    job = StoryAudioJob()
+    threading.Thread(target=_run_story_audio_job, args=(job, text, use_cache), daemon=True).start()
+    return job
 
 # Global variables
 scraped_stories = []
@@ -675,6 +3565,20 @@ def get_story_preferences():
         "tone": tone_map.get(tone, "moral lesson")
     }
 
+# Print a story to the terminal as it streams in; returns the full text
+def print_story_stream(prefs, docs, category, use_cache=True):
+    metrics = {}
+    pieces = []
+    for piece in stream_with_rag_enhanced(prefs, docs, category, use_cache=use_cache, metrics=metrics):
+        pieces.append(piece)
+        print(piece, end="", flush=True)
+    print()
+    if "ttft" in metrics:
+        print(f"\n(first words after {metrics['ttft']:.2f}s, done in {metrics.get('total', 0):.2f}s)")
+    if "prompt_tokens" in metrics:
+        print(f"(prompt tokens: {metrics['prompt_tokens']})")
+    return "".join(pieces).strip()
+
 # Main function with interactive menu
 def main():
     global scraped_stories, current_category
@@ -714,10 +3618,8 @@ def main():
             docs = retrieve_relevant_docs(prefs["topic"], current_category, top_k=3)
             
             print("Generating story...")
-            current_story = generate_with_rag_enhanced(prefs, docs, current_category)
-            
             print("\n--- Generated Story ---\n")
-            print(current_story)
+            current_story = print_story_stream(prefs, docs, current_category)
             print("\n--- End ---\n")
         
         elif choice == "2":
@@ -733,10 +3635,8 @@ def main():
             docs = retrieve_relevant_docs(prefs["topic"], current_category, top_k=3)
             
             print("Regenerating story...")
-            current_story = generate_with_rag_enhanced(prefs, docs, current_category)
-            
             print("\n--- Regenerated Story ---\n")
-            print(current_story)
+            current_story = print_story_stream(prefs, docs, current_category, use_cache=False)
             print("\n--- End ---\n")
         
         elif choice == "3":
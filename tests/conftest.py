@@ -0,0 +1,14 @@
+"""
+Shared setup: point every store and cache main.py touches at a throwaway directory
+before it is imported, and keep the OpenAI key out of the tests.
+"""
+import os
+import sys
+import tempfile
+
+_work_dir = tempfile.mkdtemp(prefix="ai_nani_tests_")
+os.environ["CHROMA_DB_PATH"] = os.path.join(_work_dir, "chroma_db")
+os.environ["AI_NANI_CACHE_DIR"] = os.path.join(_work_dir, "cache")
+os.environ["OPENAI_API_KEY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import batch_generate
+import main
+
+
+@pytest.fixture
+def prefs_file(tmp_path):
+    path = tmp_path / "prefs.jsonl"
+    path.write_text("".join(json.dumps({"id": f"r{i}", "topic": f"topic {i}"}) + "\n" for i in range(3)))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def no_retrieval(monkeypatch):
+    monkeypatch.setattr(batch_generate, "prefetch_docs", lambda records, top_k=3: {})
+    monkeypatch.setattr(batch_generate, "retrieve_relevant_docs", lambda topic, category, top_k=3: ["doc"])
+
+
+def read_rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_fallback_text_is_recorded_as_an_error(monkeypatch):
+    monkeypatch.setattr(main, "get_openai_key", lambda: None)
+
+    row = batch_generate.generate_one({"id": "x", "topic": "kindness"}, docs=["a retrieved story"])
+
+    assert row["status"] == "error"
+    assert row["error"] == "OpenAI key not available"
+    assert "story" not in row
+
+
+def test_resume_retries_fallback_rows(monkeypatch, prefs_file, tmp_path):
+    out = tmp_path / "out.jsonl"
+    fail = {"r1"}
+
+    def fake_generate(prefs, docs, category, metrics=None):
+        if prefs["topic"] == "topic 1" and "r1" in fail:
+            metrics["fallback"] = "Failed to contact OpenAI: 429"
+            return "Failed to contact OpenAI: 429\n\ndoc"
+        return "story about " + prefs["topic"]
+
+    monkeypatch.setattr(batch_generate, "generate_with_rag_enhanced", fake_generate)
+    first = batch_generate.run_batch(str(prefs_file), str(out), concurrency=2)
+    assert (first["generated"], first["errors"]) == (2, 1)
+    assert batch_generate.completed_ids(str(out)) == {"r0", "r2"}
+
+    fail.clear()
+    second = batch_generate.run_batch(str(prefs_file), str(out), concurrency=2)
+
+    assert (second["generated"], second["errors"], second["skipped"]) == (1, 0, 2)
+    ok = [row for row in read_rows(out) if row["status"] == "ok"]
+    assert sorted(row["id"] for row in ok) == ["r0", "r1", "r2"]
+    assert next(row for row in ok if row["id"] == "r1")["story"] == "story about topic 1"
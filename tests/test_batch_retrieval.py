@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+import pytest
+
+import batch_generate
+import main
+
+STORIES = [
+    {"content": f"The {animal} was {trait}. It learned to share with friends. " * 3, "source": f"{animal}.pdf",
+     "title": animal.title()}
+    for animal, trait in [("crow", "thirsty"), ("fox", "clever"), ("lion", "proud"), ("ant", "busy")]
+]
+TOPICS = ["a thirsty crow", "a clever fox", "sharing with friends", "proud lion", "busy ant"]
+
+
+def words(text):
+    return set(text.lower().replace(".", " ").split())
+
+
+class FakeCollection:
+    """Ranks chunks by shared words with the query; counts query() calls."""
+
+    def __init__(self, chunks, fail=False):
+        self.chunks = chunks
+        self.fail = fail
+        self.calls = 0
+
+    def query(self, n_results, where=None, include=None, query_texts=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("embedding failed")
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for text in query_texts:
+            ranked = sorted(self.chunks, key=lambda c: (-len(words(text) & words(c[1])), c[0]))[:n_results]
+            out["ids"].append([c[0] for c in ranked])
+            out["documents"].append([c[1] for c in ranked])
+            out["metadatas"].append([c[2] for c in ranked])
+            out["distances"].append([1.0 / (1 + len(words(text) & words(c[1]))) for c in ranked])
+        return out
+
+    def get(self, ids, include=None):
+        by_id = {c[0]: c for c in self.chunks}
+        return {"ids": ids, "metadatas": [by_id[i][2] for i in ids]}
+
+
+class FakeLexicalIndex:
+    """BM25 stand-in: the chunks sharing a word with the query, in reverse id order."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def search(self, query, category=None, limit=10, budget_ms=None):
+        found = [c for c in self.chunks if words(query) & words(c[1])]
+        return [(c[0], c[1]) for c in sorted(found, reverse=True)[:limit]]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    chunks = [chunk for i, story in enumerate(STORIES) for chunk in main.chunk_story(story, "moral", i)]
+    collection = FakeCollection(chunks)
+    monkeypatch.setattr(main, "get_story_collection", lambda category, create=True: collection)
+    monkeypatch.setattr(main, "_query_args", lambda queries: {"query_texts": list(queries)})
+    monkeypatch.setattr(main, "get_lexical_index", lambda: FakeLexicalIndex(chunks))
+    monkeypatch.setattr(main, "_retrieval_cache", OrderedDict())
+    monkeypatch.setattr(main, "_retrieval_stats", {"hits": 0, "misses": 0, "lexical_fallbacks": 0})
+    return collection
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_batch_matches_single_queries(collection, monkeypatch, mode):
+    monkeypatch.setattr(main, "RETRIEVAL_MODE", mode)
+    single = [main.retrieve_relevant_docs(topic, "moral", top_k=2, use_cache=False) for topic in TOPICS]
+
+    batch = main.retrieve_relevant_docs_batch(TOPICS, category="moral", top_k=2, use_cache=False)
+
+    assert [[hit["document"] for hit in hits] for hits in batch] == single
+
+
+def test_batch_shares_the_retrieval_cache(collection):
+    batch = main.retrieve_relevant_docs_batch(TOPICS, category="moral", top_k=2)
+    calls = collection.calls
+
+    assert main.retrieve_relevant_docs(TOPICS[0], "moral", top_k=2) == [h["document"] for h in batch[0]]
+    assert main.retrieve_relevant_docs_batch(TOPICS, category="moral", top_k=2) == batch
+    assert collection.calls == calls
+
+
+def test_single_category_failure_raises(collection):
+    collection.fail = True
+
+    with pytest.raises(RuntimeError):
+        main.retrieve_relevant_docs_batch(TOPICS, category="moral")
+
+
+def test_prefetch_leaves_failed_batches_to_per_story_retrieval(collection):
+    collection.fail = True
+    records = [{"id": f"r{i}", "topic": topic, "category": "moral"} for i, topic in enumerate(TOPICS)]
+
+    assert batch_generate.prefetch_docs(records) == {}
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+import main
+
+WORDS = ["Tenali", "Rama", "went", "to", "the", "king's", "court", "and", "said,", "\"Hello!\"",
+         "Birbal", "smiled;", "a", "crow", "flew", "over", "river", "—", "pot", "of", "gold"]
+
+
+def random_story(rng, n_sentences):
+    sentences = []
+    for _ in range(n_sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 60))]
+        sentences.append(" ".join(words) + rng.choice([".", "!", "?", ""]))
+    text = ""
+    for s in sentences:
+        text += s + rng.choice([" ", "  ", "\n", "\n\n"])
+    return text
+
+
+def squash(text):
+    return " ".join(text.split())
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_chunks_fit_and_cover_the_text(seed):
+    rng = random.Random(seed)
+    text = random_story(rng, rng.randint(1, 40))
+    max_tokens = rng.choice([8, 20, 50, 120])
+    overlap = rng.choice([0, 5, 15])
+    chunks = main.chunk_text(text, max_tokens=max_tokens, overlap_tokens=overlap)
+
+    assert chunks
+    spans = main.sentence_spans(text)
+    assert chunks[0][0] == spans[0][0]
+    assert chunks[-1][1] == spans[-1][1]
+    for (start, end), (next_start, next_end) in zip(chunks, chunks[1:]):
+        # Moves forward, and never leaves text between two chunks uncovered
+        assert start < next_start
+        assert not text[end:next_start].strip()
+    for start, end in chunks:
+        piece = text[start:end]
+        assert main.count_tokens(piece) <= max_tokens or len(piece.split()) == 1
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_assembling_every_chunk_restores_the_story(seed):
+    rng = random.Random(seed)
+    story = {"content": random_story(rng, rng.randint(1, 40)), "source": "book.pdf", "title": "T"}
+    chunks = main.chunk_story(story, category="c")
+    hits = [{"id": chunk_id, "document": doc, "metadata": meta} for chunk_id, doc, meta in chunks]
+    rng.shuffle(hits)
+
+    assembled = main.assemble_chunks(hits, limit=5)
+
+    assert len(assembled) == 1
+    assert assembled[0]["id"] == main.story_id(story, "c")
+    assert assembled[0]["chunks"] == len(chunks)
+    assert squash(assembled[0]["document"]) == squash(story["content"])
+
+
+def test_missing_chunks_are_marked_as_gaps(monkeypatch):
+    monkeypatch.setattr(main, "CHUNK_TOKENS", 20)
+    monkeypatch.setattr(main, "CHUNK_OVERLAP_TOKENS", 0)
+    text = " ".join(f"Sentence number {i} is here." for i in range(40))
+    story = {"content": text, "source": "book.pdf"}
+    chunks = main.chunk_story(story)
+    assert len(chunks) > 3
+    hits = [{"id": c[0], "document": c[1], "metadata": c[2]} for c in (chunks[2], chunks[0])]
+
+    document = main.assemble_chunks(hits, limit=1)[0]["document"]
+
+    assert document == chunks[0][1] + "\n...\n" + chunks[2][1]
+
+
+def test_assemble_keeps_best_first_parent_order():
+    stories = [{"content": f"Story {n} begins. " * 50, "source": f"{n}.pdf"} for n in range(3)]
+    hits = []
+    for story in reversed(stories):
+        chunk_id, doc, meta = main.chunk_story(story)[0]
+        hits.append({"id": chunk_id, "document": doc, "metadata": meta})
+
+    assembled = main.assemble_chunks(hits, limit=2)
+
+    assert [h["id"] for h in assembled] == [main.story_id(stories[2]), main.story_id(stories[1])]
+
+
+def test_chunk_ids_change_with_the_tokenizer(monkeypatch):
+    story = {"content": "The crow was thirsty. It found a pot. " * 30, "source": "a.pdf"}
+    before = [c[0] for c in main.chunk_story(story)]
+    monkeypatch.setattr(main, "tokenizer_id", lambda: "some-other-tokenizer")
+    after = main.chunk_story(story)
+
+    assert before != [c[0] for c in after]
+    assert all(meta["tokenizer"] == "some-other-tokenizer" for _id, _doc, meta in after)
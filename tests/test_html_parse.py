@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+import main
+from benchmarks.bench_html_parse import MALFORMED_PAGES, legacy_parse, synthetic_page
+
+PAGES = dict(MALFORMED_PAGES, synthetic_20=synthetic_page(20), empty=b"", no_headings=b"<p>a</p><p>b</p>")
+
+
+PIECES = [
+    "<h2>", "</h2>", "<h2 class='t'>", "<h3>", "</h3>", "<h1>", "<hr>", "<hr/>", "<header>", "</header>",
+    "<p>", "</p>", "<p/>", "<div>", "</div>", "<span>", "</span>", "<b>", "</b>", "<br>", "</br>", "<img src=x>",
+    "<script>var a = '<h2>x</h2>';</script>", "<style>p{}</style>", "<template><p>tpl</p></template>",
+    "<ruby>k<rt>kan</rt><rp>(</rp></ruby>", "<!-- <h2>c</h2> -->", "<![CDATA[cdata]]>", "<!DOCTYPE html>",
+    "<?php echo 1 ?>", "<body>", "</body>", "<html>", "</html>", "<head>", "</head>", "</x>",
+    "Tenali ", " Rama", "&amp;", "&nbsp;", "&#8217;", "&#x41;", "&#150;", "&bogus;", "&", "<", "\n", "  ", "\u00e9",
+]
+
+
+def random_page(rng):
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 120)))
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_matches_the_legacy_extractor(name):
+    assert main.parse_stories_from_html(PAGES[name]) == legacy_parse(PAGES[name])
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_restricted_parse_matches_beautifulsoup_on_random_markup(seed):
+    page = random_page(random.Random(seed))
+
+    assert main._parse_stories_restricted(page) == legacy_parse(page)
+    assert main._parse_stories_restricted(page.encode("utf-8")) == legacy_parse(page.encode("utf-8"))
+
+
+def test_declared_encoding_is_honoured():
+    page = "<meta charset='windows-1252'><h2>Caf\u00e9</h2><p>\u2019quoted\u2019</p>".encode("cp1252")
+
+    assert main._parse_stories_restricted(page) == legacy_parse(page)
+
+
+def test_default_parser_is_html_parser():
+    assert main.HTML_PARSER == "html.parser"
+    assert main.html_extractor_id().endswith(":html.parser")
+
+
+def test_story_layout():
+    page = b"<h2>The Crow</h2><p>It was thirsty.</p><h3>Moral</h3><p>skip</p><h2>Empty</h2>"
+
+    assert main.parse_stories_from_html(page) == ["The Crow\n\nIt was thirsty.", "Empty"]
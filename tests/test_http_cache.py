@@ -0,0 +1,62 @@
+import os
+import hashlib
+
+import pytest
+
+import main
+
+PAGE = b"<h2>The Crow</h2><p>It was thirsty.</p>"
+URL = "https://example.org/crow"
+
+
+class FakeResponse:
+    def __init__(self, content, headers=None):
+        self.content = content
+        self.headers = headers or {"ETag": '"v1"'}
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "HTTP_CACHE_DIR", str(tmp_path / "http"))
+
+
+def save(stories):
+    main.save_http_cache(URL, FakeResponse(PAGE), hashlib.sha256(PAGE).hexdigest(), stories)
+
+
+def test_same_extractor_serves_stored_stories():
+    save(["stored"])
+
+    entry = main.load_http_cache(URL)
+
+    assert entry["stories"] == ["stored"]
+    assert entry["etag"] == '"v1"'
+
+
+def test_new_extractor_version_reparses_the_body(monkeypatch):
+    save(["stored"])
+    monkeypatch.setattr(main, "HTML_EXTRACTOR_VERSION", main.HTML_EXTRACTOR_VERSION + 1)
+
+    entry = main.load_http_cache(URL)
+
+    assert entry["stories"] == ["The Crow\n\nIt was thirsty."]
+    assert entry["extractor"] == main.html_extractor_id()
+    # The re-parse is written back, so the next load is a plain hit
+    monkeypatch.setattr(main, "parse_stories_from_html", lambda *a, **k: pytest.fail("parsed twice"))
+    assert main.load_http_cache(URL)["stories"] == ["The Crow\n\nIt was thirsty."]
+
+
+def test_other_parser_reparses_the_body(monkeypatch):
+    save(["stored"])
+    monkeypatch.setattr(main, "HTML_PARSER", "html5-whatever")
+    monkeypatch.setattr(main, "parse_stories_from_html", lambda content, parser=None: ["reparsed"])
+
+    assert main.load_http_cache(URL)["stories"] == ["reparsed"]
+
+
+def test_stale_entry_without_body_is_a_miss(monkeypatch):
+    save(["stored"])
+    os.remove(main._http_cache_paths(URL)[1])
+    monkeypatch.setattr(main, "HTML_EXTRACTOR_VERSION", main.HTML_EXTRACTOR_VERSION + 1)
+
+    assert main.load_http_cache(URL) is None
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+import main
+
+
+def random_pages(rng):
+    text = "".join(rng.choice(["word ", "Title line", "\n", "\n\n", "\n\n\n", " ", "x"]) for _ in range(300))
+    cuts = sorted(rng.sample(range(len(text) + 1), rng.randint(0, 20)))
+    pages = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    # Empty pages happen (image-only PDF pages)
+    for _ in range(rng.randint(0, 3)):
+        pages.insert(rng.randint(0, len(pages)), "")
+    return pages
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_joined_split(seed):
+    pages = random_pages(random.Random(seed))
+
+    assert list(main.iter_paragraphs(pages)) == "".join(pages).split("\n\n")
+
+
+@pytest.mark.parametrize("pages", [[], [""], ["a\n", "\nb"], ["a\n", "", "\nb"], ["\n\n"], ["a", "\n", "\n", "\n", "b"]])
+def test_edge_cases(pages):
+    assert list(main.iter_paragraphs(pages)) == "".join(pages).split("\n\n")
+
+
+def test_streamed_stories_match_whole_text():
+    rng = random.Random(7)
+    paras = []
+    for i in range(30):
+        paras.append(f"Story Title {i}")
+        for j in range(rng.randint(1, 4)):
+            paras.append(f"Paragraph {j} of story {i} goes on for a while so it is kept. " * rng.randint(1, 5))
+    text = "\n\n".join(paras)
+    pages = [text[i:i + 97] for i in range(0, len(text), 97)]
+
+    streamed = list(main.iter_stories(main.iter_paragraphs(pages), "book.pdf"))
+
+    assert streamed == main.split_pdf_into_stories(text, "book.pdf")
+    assert streamed
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import main
+
+STORIES = [{"content": "Once upon a time.", "source": "book.pdf", "title": "T"}]
+
+
+@pytest.fixture
+def pdf_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "PDF_CACHE_DIR", str(tmp_path / "pdf_stories"))
+    path = tmp_path / "book.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    main.save_cached_pdf_stories(str(path), STORIES)
+    return str(path)
+
+
+def test_unchanged_file_is_served(pdf_path):
+    assert main.load_cached_pdf_stories(pdf_path) == STORIES
+
+
+def test_touched_file_with_same_bytes_is_served(pdf_path):
+    info = os.stat(pdf_path)
+    os.utime(pdf_path, (info.st_atime, info.st_mtime + 10))
+
+    assert main.load_cached_pdf_stories(pdf_path) == STORIES
+
+
+def test_changed_file_misses(pdf_path):
+    with open(pdf_path, "ab") as f:
+        f.write(b" more")
+
+    assert main.load_cached_pdf_stories(pdf_path) is None
+
+
+@pytest.mark.parametrize("name, value", [("STORY_MAX_CHARS", 500), ("SPLITTER_VERSION", 999)])
+def test_splitter_settings_are_part_of_the_key(pdf_path, monkeypatch, name, value):
+    monkeypatch.setattr(main, name, value)
+
+    assert main.load_cached_pdf_stories(pdf_path) is None
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return main.DiskResponseCache(path=str(tmp_path / "llm.sqlite3"), max_entries=3, ttl=60)
+
+
+def test_get_set_and_counters(cache):
+    assert cache.get("k") is None
+    cache.set("k", "answer")
+
+    assert cache.get("k") == "answer"
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_expired_entries_miss(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    cache.set("k", "answer")
+    now[0] += 61
+
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_is_evicted(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        cache.set(key, key)
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.set("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_connections_are_closed(cache, monkeypatch):
+    opened = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(main.sqlite3, "connect", tracking_connect)
+    cache.set("k", "v")
+    cache.get("k")
+    cache.stats()
+
+    assert len(opened) == 3
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_counters_are_exact_under_threads(cache):
+    cache.set("hit", "v")
+
+    def worker():
+        for _ in range(25):
+            cache.get("hit")
+            cache.get("miss")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (200, 200)
+
+
+def test_key_covers_the_context():
+    key = main.response_cache_key("m", "sys", "user", 0.7, ["doc a"])
+
+    assert key == main.response_cache_key("m", "sys", "user", 0.7, ["doc a"])
+    assert key != main.response_cache_key("m", "sys", "user", 0.7, ["doc b"])
+    assert key != main.response_cache_key("m", "sys", "user", 0.2, ["doc a"])
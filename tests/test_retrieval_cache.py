@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(main, "_collection_versions", {})
+    monkeypatch.setattr(main, "_retrieval_epoch", 0)
+    monkeypatch.setattr(main, "_retrieval_cache", OrderedDict())
+    monkeypatch.setattr(main, "_retrieval_stats", {"hits": 0, "misses": 0, "lexical_fallbacks": 0})
+
+
+def key(category, query="crow"):
+    return (category, main.normalize_query(query), 3, main.collection_version(category), None)
+
+
+def test_hit_after_set():
+    main._retrieval_cache_set(key("web"), ["doc"])
+
+    assert main._retrieval_cache_get(key("web", "  CROW ")) == ("doc",)
+    assert main.retrieval_cache_stats()["hits"] == 1
+
+
+def test_ingest_bump_invalidates_only_that_category():
+    main._retrieval_cache_set(key("web"), ["web doc"])
+    main._retrieval_cache_set(key("pdf"), ["pdf doc"])
+    old_key = key("web")
+
+    main.bump_collection_version("web")
+
+    assert key("web") != old_key
+    assert main._retrieval_cache_get(key("web")) is None
+    assert main._retrieval_cache_get(key("pdf")) == ("pdf doc",)
+    assert main.retrieval_cache_stats()["size"] == 1
+
+
+def test_clear_bumps_the_epoch():
+    main._retrieval_cache_set(key("web"), ["doc"])
+    old_key = key("web")
+
+    main.clear_retrieval_cache()
+
+    assert main.collection_version("web")[0] == 1
+    assert key("web") != old_key
+    assert main._retrieval_cache_get(key("web")) is None
+    assert main.retrieval_cache_stats()["size"] == 0
+
+
+def test_results_from_before_a_bump_are_not_stored():
+    # A query that started before the bump finishes after it
+    in_flight = key("web")
+    main.bump_collection_version("web")
+    main._retrieval_cache_set(in_flight, ["stale"])
+
+    cleared = key("web")
+    main.clear_retrieval_cache()
+    main._retrieval_cache_set(cleared, ["stale"])
+
+    assert main.retrieval_cache_stats()["size"] == 0
+
+
+def test_lru_eviction(monkeypatch):
+    monkeypatch.setattr(main, "RETRIEVAL_CACHE_SIZE", 2)
+    for query in ("a", "b", "c"):
+        main._retrieval_cache_set(key("web", query), [query])
+
+    assert main._retrieval_cache_get(key("web", "a")) is None
+    assert main._retrieval_cache_get(key("web", "c")) == ("c",)
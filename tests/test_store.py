@@ -0,0 +1,56 @@
+import pytest
+
+import main
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, ids=None, where=None, include=None):
+        return {"ids": [i for i in (ids if ids is not None else list(self.rows)) if i in self.rows]}
+
+    def upsert(self, ids, documents, metadatas, **kwargs):
+        for _id, meta in zip(ids, metadatas):
+            self.rows[_id] = meta
+
+    def update(self, ids, metadatas):
+        for _id, meta in zip(ids, metadatas):
+            self.rows[_id] = meta
+
+    def delete(self, ids):
+        for _id in ids:
+            self.rows.pop(_id, None)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(main, "get_story_collection", lambda category="web", create=True: collection)
+    monkeypatch.setattr(main, "_embedding_args", lambda documents: {})
+    monkeypatch.setattr(main, "CHUNK_TOKENS", 20)
+    return collection
+
+
+def story(n, extra=""):
+    return {"content": f"Story {n} has several sentences. " * 6 + extra, "source": f"{n}.pdf", "title": f"S{n}"}
+
+
+def test_counts_are_per_story(collection):
+    first = main.store_in_chromadb([story(1), story(2), story(3)], "stats")
+    assert (first["stories"], first["added"], first["unchanged"], first["removed"]) == (3, 3, 0, 0)
+    assert first["chunks_added"] == len(collection.rows) > 3
+
+    # Story 2 is edited (a new story id replaces the old one), story 3 is dropped, story 4 is new
+    second = main.store_in_chromadb([story(1), story(2, "A new ending."), story(4)], "stats")
+
+    assert (second["stories"], second["added"], second["unchanged"], second["removed"]) == (3, 2, 1, 2)
+    assert second["chunks_removed"] > 2
+
+
+def test_chunk_parent_id():
+    parent = main.story_id(story(1), "moral_tales")
+    chunk_id = main.chunk_story(story(1), "moral_tales")[0][0]
+
+    assert main.chunk_parent_id(chunk_id) == parent
+    assert main.chunk_parent_id(parent) == parent
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+def chunk(text=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeCompletions:
+    def __init__(self, accepts_stream_options):
+        self.accepts_stream_options = accepts_stream_options
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if "stream_options" in kwargs and not self.accepts_stream_options:
+            raise TypeError("create() got an unexpected keyword argument 'stream_options'")
+        pieces = [chunk(" Once"), chunk(" upon a time.")]
+        if "stream_options" in kwargs:
+            pieces.append(chunk(usage=SimpleNamespace(prompt_tokens=123)))
+        return iter(pieces)
+
+
+@pytest.fixture
+def completions(monkeypatch, request):
+    completions = FakeCompletions(request.param)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(main, "openai", SimpleNamespace())
+    monkeypatch.setattr(main, "get_openai_key", lambda: "test-key")
+    monkeypatch.setattr(main, "get_openai_client", lambda key=None: client)
+    monkeypatch.setattr(main, "get_response_cache", lambda: None)
+    return completions
+
+
+PREFS = {"topic": "a crow", "tone": "funny", "length": "short"}
+
+
+@pytest.mark.parametrize("completions", [True], indirect=True)
+def test_usage_comes_from_the_stream(completions):
+    metrics = {}
+
+    assert main.generate_with_rag_enhanced(PREFS, ["doc"], metrics=metrics) == "Once upon a time."
+    assert metrics["prompt_tokens"] == 123
+    assert "fallback" not in metrics
+
+
+@pytest.mark.parametrize("completions", [False], indirect=True)
+def test_old_sdk_without_stream_options_still_generates(completions):
+    metrics = {}
+
+    assert main.generate_with_rag_enhanced(PREFS, ["doc"], metrics=metrics) == "Once upon a time."
+    assert "fallback" not in metrics
+    assert len(completions.calls) == 2
+    assert "stream_options" not in completions.calls[1]
+    assert metrics["prompt_tokens"] > 0  # local estimate